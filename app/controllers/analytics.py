@@ -0,0 +1,157 @@
+import os
+from datetime import date, datetime, time, timedelta
+from sqlmodel import Session, select, func, or_
+from sqlalchemy import Date, and_, case, cast, delete, insert, literal, true, union
+from app.models.analytics import OpsVolumeRollup, RollupWatermark
+from app.models.ops_files import OpsFile, OpsFileTombstone
+
+# Seconds between background refreshes of the rollups (0 disables the refresher)
+OPS_ROLLUPS_REFRESH_INTERVAL = float(os.environ.get("OPS_ROLLUPS_REFRESH_INTERVAL", "300"))
+
+GRANULARITIES = ("week", "month")
+VOLUME_ROLLUP_WATERMARK = "ops_volume"
+# Rows committed late (long transactions, clock skew between workers) are caught by the next refreshes
+WATERMARK_LAG = timedelta(minutes=5)
+# Arbitrary key of the Postgres advisory lock preventing concurrent refreshes from several workers
+REFRESH_LOCK_KEY = 7301
+
+# Grouping dimensions of the analytics endpoint, by name
+VOLUME_DIMENSIONS = {
+    "op_type": (OpsVolumeRollup.op_type,),
+    "client": (OpsVolumeRollup.client_id,),
+    "carrier": (OpsVolumeRollup.carrier_id,),
+    "lane": (OpsVolumeRollup.origin_country_id, OpsVolumeRollup.destination_country_id),
+}
+
+
+def _gross_weight_kg():
+    unit = func.lower(func.coalesce(OpsFile.gross_weight_unit, "kg"))
+    return case(
+        (unit.in_(("kg", "kgs")), OpsFile.gross_weight_value),
+        (unit.in_(("lb", "lbs")), OpsFile.gross_weight_value * 0.45359237),
+        (unit.in_(("t", "ton", "tons")), OpsFile.gross_weight_value * 1000),
+        else_=None,
+    )
+
+def _volume_m3():
+    unit = func.lower(func.coalesce(OpsFile.volume_unit, "m3"))
+    return case(
+        (unit.in_(("m3", "cbm")), OpsFile.volume_value),
+        (unit.in_(("l", "lt")), OpsFile.volume_value / 1000),
+        (unit.in_(("ft3", "cft")), OpsFile.volume_value * 0.028316846592),
+        else_=None,
+    )
+
+
+def _bucket_end(granularity: str, bucket_start: date) -> date:
+    if granularity == "week":
+        return bucket_start + timedelta(days=7)
+    # First day of the next month
+    return (bucket_start.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+def _refresh_granularity(db: Session, granularity: str, since: datetime | None):
+    """
+        Recompute the rollups of the buckets holding ops files created, updated or deleted since the watermark
+        (all of them on the first run). A bucket is the creation date truncated, which never changes
+    """
+    bucket = cast(func.date_trunc(granularity, OpsFile.created_at), Date)
+    rollups = delete(OpsVolumeRollup).where(OpsVolumeRollup.granularity == granularity)
+
+    if since is None:
+        db.execute(rollups)
+        ops_files_in_buckets = true()
+    else:
+        # Each select is served by its (created_at | updated_at | deleted_at, op_id) index
+        deleted_bucket = cast(func.date_trunc(granularity, OpsFileTombstone.created_at), Date)
+        changed_buckets = db.execute(union(
+            select(bucket).where(OpsFile.created_at > since),
+            select(bucket).where(OpsFile.updated_at > since),
+            select(deleted_bucket).where(OpsFileTombstone.deleted_at > since),
+        )).scalars().all()
+        if not changed_buckets:
+            return
+
+        db.execute(rollups.where(OpsVolumeRollup.bucket_start.in_(changed_buckets)))
+        # Created at ranges rather than date_trunc(created_at), so the ops files are read over ix_op_files_created_at_op_id
+        ops_files_in_buckets = or_(*[
+            and_(
+                OpsFile.created_at >= datetime.combine(bucket_start, time.min),
+                OpsFile.created_at < datetime.combine(_bucket_end(granularity, bucket_start), time.min),
+            )
+            for bucket_start in changed_buckets
+        ])
+
+    dimensions = (OpsFile.op_type, OpsFile.client_id, OpsFile.carrier_id, OpsFile.origin_country_id, OpsFile.destination_country_id)
+    aggregates = (
+        select(
+            literal(granularity),
+            bucket,
+            *dimensions,
+            func.count(OpsFile.op_id),
+            func.coalesce(func.sum(_gross_weight_kg()), 0),
+            func.coalesce(func.sum(_volume_m3()), 0),
+        )
+        .where(ops_files_in_buckets)
+        .group_by(bucket, *dimensions)
+    )
+    db.execute(
+        insert(OpsVolumeRollup).from_select(
+            [
+                "granularity", "bucket_start",
+                "op_type", "client_id", "carrier_id", "origin_country_id", "destination_country_id",
+                "ops_count", "gross_weight_kg", "volume_m3",
+            ],
+            aggregates,
+        )
+    )
+
+def refresh_volume_rollups(db: Session) -> bool:
+    """
+        Incremental refresh of the volume rollups from the created_at/updated_at watermark.
+        Returns False when another worker is already refreshing them.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        locked = db.exec(select(func.pg_try_advisory_xact_lock(REFRESH_LOCK_KEY))).one()
+        if not locked:
+            return False
+
+    started_at = datetime.utcnow()
+    watermark = db.get(RollupWatermark, VOLUME_ROLLUP_WATERMARK)
+    since = watermark.watermark if watermark is not None else None
+
+    for granularity in GRANULARITIES:
+        _refresh_granularity(db, granularity, since)
+
+    if watermark is None:
+        watermark = RollupWatermark(name=VOLUME_ROLLUP_WATERMARK, watermark=started_at)
+    watermark.watermark = started_at - WATERMARK_LAG
+    db.add(watermark)
+    db.commit()
+    return True
+
+
+def ops_volume_statement(granularity: str, group_by: list[str], date_from: date | None = None, date_to: date | None = None):
+    """
+        Builds the volume analytics statement over the rollups: buckets of the granularity between
+        the dates (bucket start), grouped by the requested dimensions
+    """
+    columns = [OpsVolumeRollup.bucket_start]
+    for dimension in dict.fromkeys(group_by):
+        columns.extend(VOLUME_DIMENSIONS[dimension])
+
+    statement = (
+        select(
+            *columns,
+            func.sum(OpsVolumeRollup.ops_count).label("ops_count"),
+            func.sum(OpsVolumeRollup.gross_weight_kg).label("gross_weight_kg"),
+            func.sum(OpsVolumeRollup.volume_m3).label("volume_m3"),
+        )
+        .where(OpsVolumeRollup.granularity == granularity)
+        .group_by(*columns)
+        .order_by(*columns)
+    )
+    if date_from is not None:
+        statement = statement.where(OpsVolumeRollup.bucket_start >= date_from)
+    if date_to is not None:
+        statement = statement.where(OpsVolumeRollup.bucket_start <= date_to)
+    return statement
@@ -0,0 +1,146 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Annotated, Optional
+from uuid import UUID
+from fastapi import Depends, HTTPException
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy.orm import joinedload
+from sqlmodel import Session, func, select
+from app.lib.tokens import sign_token, read_token
+from app.models.users import User, UserTokenClaims
+
+log = logging.getLogger(__name__)
+
+AUTH_TOKEN_SECRET = os.environ.get("AUTH_TOKEN_SECRET", "")
+if not AUTH_TOKEN_SECRET:
+    # Tokens are then only valid for this process and until its restart
+    log.warning("AUTH_TOKEN_SECRET is not set, a random secret is used")
+_secret = AUTH_TOKEN_SECRET.encode("utf-8") if AUTH_TOKEN_SECRET else os.urandom(32)
+
+AUTH_TOKEN_TTL = int(os.environ.get("AUTH_TOKEN_TTL", str(12 * 3600))) # Seconds
+# Until clients send tokens, requests without a valid one are still allowed
+AUTH_TOKENS_REQUIRED = os.environ.get("AUTH_TOKENS_REQUIRED", "false").lower() in ("1", "true", "yes")
+
+REVOKED_USERS_REFRESH_INTERVAL = float(os.environ.get("REVOKED_USERS_REFRESH_INTERVAL", "60")) # Seconds, 0 to disable
+REVOKED_USERS_MAX_SIZE = int(os.environ.get("REVOKED_USERS_MAX_SIZE", "10000"))
+
+
+"""
+    Revoked users
+
+    Tokens are verified without DB lookups, so users disabled, deleted or changed (role, password)
+    after a token was issued are kept in memory. Disabled users are reloaded from the DB periodically
+    (every worker sees them). Deletions and the other changes are kept in a bounded LRU by the process
+    handling them (a refresh does not clear them), the tokens of other workers expire within AUTH_TOKEN_TTL.
+"""
+
+class RevokedUsers:
+    """
+        Thread-safe registry of rejected tokens: an LRU of user IDs whose tokens issued up to a timestamp
+        are rejected (infinite for deleted users), and the set of disabled users (every token rejected)
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._revoked_at: OrderedDict[UUID, float] = OrderedDict()
+        self._disabled: set[UUID] = set()
+        self._lock = threading.Lock()
+
+    def revoke(self, user_id: UUID, revoked_at: float | None = None):
+        """Reject the tokens of the user issued until now (or every token when revoked_at is infinite, e.g. deleted users)."""
+        with self._lock:
+            self._revoked_at[user_id] = time.time() if revoked_at is None else revoked_at
+            self._revoked_at.move_to_end(user_id)
+            while len(self._revoked_at) > self.max_size:
+                self._revoked_at.popitem(last=False)
+
+    def disable(self, user_id: UUID):
+        """Reject every token of the user until the next refresh tells it is enabled again."""
+        with self._lock:
+            self._disabled.add(user_id)
+
+    def replace_disabled(self, disabled_users_ids: set[UUID]):
+        """Every token of the disabled users is rejected, users enabled again are accepted again (revocations are kept)."""
+        with self._lock:
+            self._disabled = set(disabled_users_ids)
+
+    def is_revoked(self, user_id: UUID, issued_at: float) -> bool:
+        with self._lock:
+            if user_id in self._disabled:
+                return True
+            revoked_at = self._revoked_at.get(user_id)
+        return revoked_at is not None and issued_at <= revoked_at
+
+revoked_users = RevokedUsers(REVOKED_USERS_MAX_SIZE)
+
+
+def refresh_revoked_users(db: Session):
+    disabled_users_ids = db.exec(select(User.user_id).where(User.disabled == True).limit(REVOKED_USERS_MAX_SIZE)).all()
+    revoked_users.replace_disabled(set(disabled_users_ids))
+
+
+def user_by_email_statement(email: str):
+    """
+        User (with the role) of a normalized email, served by the ux_users_email_lower functional index.
+        Also matches the emails stored before they were normalized.
+    """
+    return select(User).options(joinedload(User.role)).where(func.lower(User.email) == email)
+
+
+"""
+    Access tokens
+"""
+
+def issue_access_token(user: User) -> tuple[str, datetime]:
+    """ HMAC-signed token carrying the user ID and role. Returns (token, expiration) """
+    issued_at = time.time()
+    expires_at = issued_at + AUTH_TOKEN_TTL
+    token = sign_token({"sub": str(user.user_id), "role": user.role_id, "iat": issued_at, "exp": expires_at}, _secret)
+    return token, datetime.utcfromtimestamp(expires_at)
+
+def verify_access_token(token: str) -> UserTokenClaims:
+    """ Claims of a valid token, checked in memory only. Raises ValueError if invalid, expired or revoked """
+    claims = read_token(token, _secret)
+    try:
+        user_id = UUID(claims["sub"])
+        issued_at = float(claims["iat"])
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError("Malformed token") from e
+
+    if revoked_users.is_revoked(user_id, issued_at):
+        raise ValueError("Revoked token")
+
+    return UserTokenClaims(
+        user_id=user_id,
+        role_id=claims.get("role"),
+        issued_at=datetime.utcfromtimestamp(issued_at),
+        expires_at=datetime.utcfromtimestamp(claims["exp"]),
+    )
+
+_bearer_scheme = HTTPBearer(auto_error=False)
+
+async def require_token(
+    credentials: Annotated[Optional[HTTPAuthorizationCredentials], Depends(_bearer_scheme)],
+) -> UserTokenClaims | None:
+    """
+        Routers dependency verifying the "Authorization: Bearer <token>" header.
+        Requests without a valid token are rejected only if AUTH_TOKENS_REQUIRED
+    """
+    if credentials is None:
+        if AUTH_TOKENS_REQUIRED:
+            raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+        return None
+
+    try:
+        return verify_access_token(credentials.credentials)
+    except ValueError as e:
+        if AUTH_TOKENS_REQUIRED:
+            raise HTTPException(status_code=401, detail=str(e), headers={"WWW-Authenticate": "Bearer"})
+        return None
+
+# Claims of the current request, for handlers that need the user (resolved once per request)
+TokenClaimsDep = Annotated[Optional[UserTokenClaims], Depends(require_token)]
@@ -0,0 +1,621 @@
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta
+from uuid import UUID
+from sqlmodel import Session, select, desc, func, or_
+from sqlalchemy import tuple_, exists, case, literal, insert, update, delete, true
+from sqlalchemy.orm import joinedload, selectinload, aliased
+from app.models.ops_files import OpsFile, OpsFilePublic, OpsFileFilters, OpsFileComment, OpsFileCargoPackage, OpsFileCargoPackageCreateWithoutOpId, OpsFileTombstone, OpsStatus, SEARCH_TS_CONFIG, ops_file_search_document, ops_file_comment_search_document
+from app.models.ops_files_partners import OpsFilePartnerLink
+from app.models.carriers import Carrier
+from app.models.clients import Client
+from app.models.partners import Partner
+from app.models.users import User, UserRole
+from app.models.geodata import Country
+
+
+# Loader options needed to serialize an OpsFilePublic without lazy loads.
+# Many-to-one relations are joined in the main query, collections are loaded
+# with one extra SELECT ... IN per relation, whatever the number of rows.
+OPS_FILE_LOAD_OPTIONS = (
+    joinedload(OpsFile.client),
+    joinedload(OpsFile.status),
+    joinedload(OpsFile.origin_country),
+    joinedload(OpsFile.destination_country),
+    joinedload(OpsFile.creator).joinedload(User.role),
+    joinedload(OpsFile.assignee).joinedload(User.role),
+    selectinload(OpsFile.carrier).options(
+        joinedload(Carrier.carrier_type),
+        selectinload(Carrier.carrier_contacts),
+    ),
+    selectinload(OpsFile.partners).options(
+        joinedload(Partner.partner_type),
+        joinedload(Partner.country),
+        selectinload(Partner.partner_contacts),
+    ),
+    selectinload(OpsFile.packaging),
+)
+
+# Comment author (and role) embedded in OpsFileCommentPublic
+COMMENT_LOAD_OPTIONS = (
+    joinedload(OpsFileComment.author).joinedload(User.role),
+)
+
+
+def get_ops_file(db: Session, ops_file_id: UUID) -> OpsFile | None:
+    """
+        Get an ops file with every relation required by OpsFilePublic already loaded
+    """
+    statement = select(OpsFile).options(*OPS_FILE_LOAD_OPTIONS).where(OpsFile.op_id == ops_file_id)
+    return db.exec(statement).first()
+
+
+def touch_ops_file(db: Session, ops_file_id: UUID):
+    """
+        Bump the ops file updated_at after a change of its children (comments, packaging, partners)
+    """
+    db.execute(update(OpsFile).where(OpsFile.op_id == ops_file_id).values(updated_at=datetime.utcnow()))
+
+def delete_ops_file_with_tombstone(db: Session, ops_file: OpsFile):
+    """
+        Delete an ops file leaving a tombstone for the changes feed
+    """
+    db.add(OpsFileTombstone(op_id=ops_file.op_id, created_at=ops_file.created_at))
+    db.delete(ops_file)
+
+
+def find_missing_partners_ids(db: Session, partners_ids: list[UUID]) -> list[UUID]:
+    """
+        Check the existence of several partners in a single query. Returns the IDs not found
+    """
+    if not partners_ids:
+        return []
+    found_ids = set(db.exec(select(Partner.partner_id).where(Partner.partner_id.in_(partners_ids))).all())
+    return [partner_id for partner_id in partners_ids if partner_id not in found_ids]
+
+
+def insert_ops_file_partners(db: Session, ops_file_id: UUID, partners_ids: list[UUID]):
+    """
+        Link partners to an ops file with a single multi-row INSERT
+    """
+    # Duplicated IDs would violate the link primary key
+    unique_partners_ids = list(dict.fromkeys(partners_ids))
+    if not unique_partners_ids:
+        return
+    db.execute(
+        insert(OpsFilePartnerLink),
+        [{"op_id": ops_file_id, "partner_id": partner_id} for partner_id in unique_partners_ids],
+    )
+
+def insert_ops_file_packaging(db: Session, ops_file_id: UUID, packaging_data: list[OpsFileCargoPackageCreateWithoutOpId]):
+    """
+        Add cargo packages to an ops file with a single multi-row INSERT
+    """
+    if not packaging_data:
+        return
+    created_at = datetime.utcnow()
+    db.execute(
+        insert(OpsFileCargoPackage),
+        [
+            {"op_id": ops_file_id, "quantity": package.quantity, "units": package.units, "created_at": created_at}
+            for package in packaging_data
+        ],
+    )
+
+def sync_ops_file_partners(db: Session, ops_file_id: UUID, partners_ids: list[UUID]) -> list[UUID]:
+    """
+        Make the ops file partners match the given list, only unlinking removed partners and linking new ones.
+        Returns the new partners IDs not found (nothing is written then)
+    """
+    requested_ids = list(dict.fromkeys(partners_ids))
+    current_ids = set(db.exec(select(OpsFilePartnerLink.partner_id).where(OpsFilePartnerLink.op_id == ops_file_id)).all())
+
+    added_ids = [partner_id for partner_id in requested_ids if partner_id not in current_ids]
+    removed_ids = current_ids.difference(requested_ids)
+
+    # Existing links are already valid, only the new partners are checked
+    missing_partners_ids = find_missing_partners_ids(db, added_ids)
+    if missing_partners_ids:
+        return missing_partners_ids
+
+    if removed_ids:
+        db.execute(
+            delete(OpsFilePartnerLink)
+            .where(OpsFilePartnerLink.op_id == ops_file_id, OpsFilePartnerLink.partner_id.in_(removed_ids))
+        )
+    insert_ops_file_partners(db, ops_file_id, added_ids)
+    return []
+
+def sync_ops_file_packaging(db: Session, ops_file_id: UUID, packaging_data: list[OpsFileCargoPackageCreateWithoutOpId]):
+    """
+        Make the ops file packages match the given list (by position), only writing the changed lines:
+        changed lines are updated, extra current lines are deleted and extra new lines are inserted
+    """
+    current_packages = db.exec(
+        select(OpsFileCargoPackage.package_id, OpsFileCargoPackage.quantity, OpsFileCargoPackage.units)
+        .where(OpsFileCargoPackage.op_id == ops_file_id)
+        .order_by(OpsFileCargoPackage.package_id)
+    ).all()
+
+    changed_packages = [
+        {"package_id": current.package_id, "quantity": package.quantity, "units": package.units}
+        for current, package in zip(current_packages, packaging_data)
+        if (current.quantity, current.units) != (package.quantity, package.units)
+    ]
+    if changed_packages:
+        # Bulk UPDATE by primary key
+        db.execute(update(OpsFileCargoPackage), changed_packages)
+
+    removed_packages_ids = [current.package_id for current in current_packages[len(packaging_data):]]
+    if removed_packages_ids:
+        db.execute(delete(OpsFileCargoPackage).where(OpsFileCargoPackage.package_id.in_(removed_packages_ids)))
+
+    insert_ops_file_packaging(db, ops_file_id, packaging_data[len(current_packages):])
+
+
+def ops_files_conditions(filters: OpsFileFilters) -> list:
+    """
+        Translates the list filters into SQL conditions over OpsFile
+    """
+    conditions = []
+
+    if filters.status_id is not None:
+        conditions.append(OpsFile.status_id == filters.status_id)
+    if filters.client_id is not None:
+        conditions.append(OpsFile.client_id == filters.client_id)
+    if filters.assignee_user_id is not None:
+        conditions.append(OpsFile.assignee_user_id == filters.assignee_user_id)
+    if filters.op_type is not None:
+        conditions.append(OpsFile.op_type == filters.op_type)
+    if filters.origin_country_id is not None:
+        conditions.append(OpsFile.origin_country_id == filters.origin_country_id)
+    if filters.destination_country_id is not None:
+        conditions.append(OpsFile.destination_country_id == filters.destination_country_id)
+    # Schedules ranges
+    if filters.etd_from is not None:
+        conditions.append(OpsFile.estimated_time_departure >= filters.etd_from)
+    if filters.etd_to is not None:
+        conditions.append(OpsFile.estimated_time_departure <= filters.etd_to)
+    if filters.eta_from is not None:
+        conditions.append(OpsFile.estimated_time_arrival >= filters.eta_from)
+    if filters.eta_to is not None:
+        conditions.append(OpsFile.estimated_time_arrival <= filters.eta_to)
+
+    return conditions
+
+
+def _keyset_page(statement, limit: int, after: tuple[datetime, UUID] | None):
+    """
+        Applies the (created_at, op_id) keyset ordering and limit to an ops files statement.
+        One extra row is fetched so the caller knows if there is a next page.
+    """
+    # Rows strictly after the last seen (created_at, op_id) position
+    if after is not None:
+        statement = statement.where(tuple_(OpsFile.created_at, OpsFile.op_id) < tuple_(*after))
+
+    return (
+        statement
+        .order_by(desc(OpsFile.created_at), desc(OpsFile.op_id))
+        .limit(limit + 1)
+    )
+
+
+def _user_version(user, role):
+    """ Columns of an embedded UserPublic (users have no updated_at), as a single text value """
+    return func.concat_ws("|", user.name, user.email, user.disabled, role.role_name)
+
+def _ops_file_versions_statement():
+    """
+        Lightweight statement of the versions of ops files and the rows embedded in their payload
+        (client columns, carrier and partners updated_at, which contacts writes bump, creator, assignee
+        and last comment author), used to build ETags without loading the graph
+    """
+    def partners_aggregate(aggregate):
+        return (
+            select(aggregate)
+            .join(OpsFilePartnerLink, OpsFilePartnerLink.partner_id == Partner.partner_id)
+            .where(OpsFilePartnerLink.op_id == OpsFile.op_id)
+            .correlate(OpsFile)
+            .scalar_subquery()
+        )
+
+    creator, creator_role = aliased(User), aliased(UserRole)
+    assignee, assignee_role = aliased(User), aliased(UserRole)
+    author, author_role = aliased(User), aliased(UserRole)
+    # Newest comment first, over the (op_id, created_at) index
+    last_comment_author = (
+        select(_user_version(author, author_role))
+        .select_from(OpsFileComment)
+        .join(author, author.user_id == OpsFileComment.author_user_id)
+        .outerjoin(author_role, author_role.role_id == author.role_id)
+        .where(OpsFileComment.op_id == OpsFile.op_id)
+        .order_by(desc(OpsFileComment.created_at), desc(OpsFileComment.comment_id))
+        .limit(1)
+        .correlate(OpsFile)
+        .scalar_subquery()
+    )
+
+    return (
+        select(
+            OpsFile.op_id,
+            OpsFile.created_at,
+            OpsFile.updated_at,
+            Client.name, Client.tax_id, Client.address, Client.contact_name,
+            Client.contact_phone, Client.contact_email, Client.disabled,
+            Carrier.updated_at.label("carrier_updated_at"),
+            partners_aggregate(func.max(Partner.updated_at)).label("partners_updated_at"),
+            partners_aggregate(func.count(Partner.partner_id)).label("partners_count"),
+            _user_version(creator, creator_role).label("creator_version"),
+            _user_version(assignee, assignee_role).label("assignee_version"),
+            last_comment_author.label("last_comment_author_version"),
+        )
+        .join(Client, Client.client_id == OpsFile.client_id)
+        .outerjoin(Carrier, Carrier.carrier_id == OpsFile.carrier_id)
+        .outerjoin(creator, creator.user_id == OpsFile.creator_user_id)
+        .outerjoin(creator_role, creator_role.role_id == creator.role_id)
+        .outerjoin(assignee, assignee.user_id == OpsFile.assignee_user_id)
+        .outerjoin(assignee_role, assignee_role.role_id == assignee.role_id)
+    )
+
+def ops_file_version_statement(ops_file_id: UUID):
+    return _ops_file_versions_statement().where(OpsFile.op_id == ops_file_id)
+
+def ops_files_page_versions_statement(filters: OpsFileFilters, limit: int, after: tuple[datetime, UUID] | None = None):
+    """
+        Builds the keyset paginated statement of ops files (newest first), only with the versions columns
+    """
+    return _keyset_page(_ops_file_versions_statement().where(*ops_files_conditions(filters)), limit, after)
+
+def get_ops_files(db: Session, ops_files_ids: list[UUID]) -> list[OpsFile]:
+    """
+        Get several ops files (in the given order) with every relation required by OpsFilePublic already loaded
+    """
+    if not ops_files_ids:
+        return []
+    statement = select(OpsFile).options(*OPS_FILE_LOAD_OPTIONS).where(OpsFile.op_id.in_(ops_files_ids))
+    ops_files_by_id = {ops_file.op_id: ops_file for ops_file in db.exec(statement).all()}
+    return [ops_files_by_id[ops_file_id] for ops_file_id in ops_files_ids if ops_file_id in ops_files_by_id]
+
+
+def get_comments_overview(db: Session, ops_files_ids: list[UUID]) -> dict[UUID, tuple[int, OpsFileComment]]:
+    """
+        Comments count and last comment of several ops files, in a single query. Per ops file, both are read
+        from the (op_id, created_at) index: a LATERAL backward scan stopping at the last comment, and an
+        index-only count (instead of window functions over every comment of the ops files).
+        Ops files without comments are not in the result
+    """
+    if not ops_files_ids:
+        return {}
+    # Correlated to the ops file only, not to the selected (last) comment
+    comments = aliased(OpsFileComment)
+    last_comment_id = (
+        select(comments.comment_id)
+        .where(comments.op_id == OpsFile.op_id)
+        .order_by(desc(comments.created_at), desc(comments.comment_id))
+        .limit(1)
+        .lateral("last_comment_id")
+    )
+    comment_count = (
+        select(func.count())
+        .select_from(comments)
+        .where(comments.op_id == OpsFile.op_id)
+        .scalar_subquery()
+    )
+    statement = (
+        select(OpsFileComment, comment_count.label("comment_count"))
+        .select_from(OpsFile)
+        .join(last_comment_id, true())
+        .join(OpsFileComment, OpsFileComment.comment_id == last_comment_id.c.comment_id)
+        .options(*COMMENT_LOAD_OPTIONS)
+        .where(OpsFile.op_id.in_(ops_files_ids))
+    )
+    return {comment.op_id: (comment_count, comment) for comment, comment_count in db.exec(statement).all()}
+
+def ops_files_public(db: Session, ops_files: list[OpsFile]) -> list[OpsFilePublic]:
+    """
+        Serialize ops files (loaded with OPS_FILE_LOAD_OPTIONS) with their comments count and last comment
+    """
+    overview = get_comments_overview(db, [ops_file.op_id for ops_file in ops_files])
+    serialized = []
+    for ops_file in ops_files:
+        comment_count, last_comment = overview.get(ops_file.op_id, (0, None))
+        serialized.append(
+            OpsFilePublic.model_validate(ops_file, update={"comment_count": comment_count, "last_comment": last_comment})
+        )
+    return serialized
+
+def get_ops_file_public(db: Session, ops_file_id: UUID) -> OpsFilePublic | None:
+    ops_file = get_ops_file(db, ops_file_id)
+    if ops_file is None:
+        return None
+    return ops_files_public(db, [ops_file])[0]
+
+def get_ops_files_public(db: Session, ops_files_ids: list[UUID]) -> list[OpsFilePublic]:
+    return ops_files_public(db, get_ops_files(db, ops_files_ids))
+
+def ops_file_comment_statement(comment_id: UUID):
+    return select(OpsFileComment).options(*COMMENT_LOAD_OPTIONS).where(OpsFileComment.comment_id == comment_id)
+
+def ops_file_comments_page_statement(ops_file_id: UUID, limit: int, after: tuple[datetime, UUID] | None = None):
+    """
+        Builds the keyset paginated statement of an ops file comments (newest first).
+        One extra row is fetched so the caller knows if there is a next page.
+    """
+    statement = select(OpsFileComment).options(*COMMENT_LOAD_OPTIONS).where(OpsFileComment.op_id == ops_file_id)
+    if after is not None:
+        statement = statement.where(tuple_(OpsFileComment.created_at, OpsFileComment.comment_id) < tuple_(*after))
+    return (
+        statement
+        .order_by(desc(OpsFileComment.created_at), desc(OpsFileComment.comment_id))
+        .limit(limit + 1)
+    )
+
+
+def ops_files_summary_statement(filters: OpsFileFilters, limit: int, after: tuple[datetime, UUID] | None = None):
+    """
+        Builds the keyset paginated statement of the ops files table view.
+        Only the displayed columns are selected (single joined query, no ORM entities).
+    """
+    assignee = aliased(User)
+    statement = (
+        select(
+            OpsFile.op_id,
+            OpsFile.op_type,
+            OpsFile.master_transport_doc,
+            OpsFile.house_transport_doc,
+            OpsFile.client_id,
+            Client.name.label("client_name"),
+            OpsFile.status_id,
+            OpsStatus.status_name,
+            OpsFile.estimated_time_departure,
+            OpsFile.estimated_time_arrival,
+            OpsFile.assignee_user_id,
+            assignee.name.label("assignee_name"),
+            OpsFile.created_at,
+            OpsFile.updated_at,
+        )
+        .join(Client, Client.client_id == OpsFile.client_id)
+        .join(OpsStatus, OpsStatus.status_id == OpsFile.status_id)
+        .outerjoin(assignee, assignee.user_id == OpsFile.assignee_user_id)
+        .where(*ops_files_conditions(filters))
+    )
+    return _keyset_page(statement, limit, after)
+
+
+def ops_files_export_statement(filters: OpsFileFilters):
+    """
+        Builds the flat export statement of ops files (oldest first) with client, carrier, status and countries names
+    """
+    origin_country = aliased(Country)
+    destination_country = aliased(Country)
+    return (
+        select(
+            OpsFile.op_id,
+            OpsFile.op_type,
+            OpsStatus.status_name,
+            Client.name.label("client_name"),
+            Client.tax_id.label("client_tax_id"),
+            Carrier.name.label("carrier_name"),
+            OpsFile.origin_location,
+            origin_country.name.label("origin_country_name"),
+            origin_country.iso2_code.label("origin_country_iso2_code"),
+            OpsFile.destination_location,
+            destination_country.name.label("destination_country_name"),
+            destination_country.iso2_code.label("destination_country_iso2_code"),
+            OpsFile.estimated_time_departure,
+            OpsFile.actual_time_departure,
+            OpsFile.estimated_time_arrival,
+            OpsFile.actual_time_arrival,
+            OpsFile.cargo_description,
+            OpsFile.gross_weight_value,
+            OpsFile.gross_weight_unit,
+            OpsFile.volume_value,
+            OpsFile.volume_unit,
+            OpsFile.master_transport_doc,
+            OpsFile.house_transport_doc,
+            OpsFile.incoterm,
+            OpsFile.modality,
+            OpsFile.voyage,
+            OpsFile.created_at,
+            OpsFile.updated_at,
+        )
+        .join(Client, Client.client_id == OpsFile.client_id)
+        .join(OpsStatus, OpsStatus.status_id == OpsFile.status_id)
+        .outerjoin(Carrier, Carrier.carrier_id == OpsFile.carrier_id)
+        .outerjoin(origin_country, origin_country.country_id == OpsFile.origin_country_id)
+        .outerjoin(destination_country, destination_country.country_id == OpsFile.destination_country_id)
+        .where(*ops_files_conditions(filters))
+        .order_by(OpsFile.created_at, OpsFile.op_id)
+    )
+
+
+def load_ops_files_relations(db: Session, ops_files_ids: list[UUID], expand: set[str]) -> dict[str, dict[UUID, list]]:
+    """
+        Load the requested heavy relations ("comments", "partners", "packaging") of several ops files.
+        Each relation costs a single SELECT ... IN, results are grouped by ops file ID.
+    """
+    relations = {}
+
+    if "comments" in expand:
+        comments = defaultdict(list)
+        statement = (
+            select(OpsFileComment)
+            .options(*COMMENT_LOAD_OPTIONS)
+            .where(OpsFileComment.op_id.in_(ops_files_ids))
+            .order_by(OpsFileComment.created_at)
+        )
+        for comment in db.exec(statement).all():
+            comments[comment.op_id].append(comment)
+        relations["comments"] = comments
+
+    if "partners" in expand:
+        partners = defaultdict(list)
+        statement = (
+            select(OpsFilePartnerLink.op_id, Partner)
+            .join(Partner, Partner.partner_id == OpsFilePartnerLink.partner_id)
+            .options(
+                joinedload(Partner.partner_type),
+                joinedload(Partner.country),
+                selectinload(Partner.partner_contacts),
+            )
+            .where(OpsFilePartnerLink.op_id.in_(ops_files_ids))
+        )
+        for op_id, partner in db.exec(statement).all():
+            partners[op_id].append(partner)
+        relations["partners"] = partners
+
+    if "packaging" in expand:
+        packaging = defaultdict(list)
+        statement = (
+            select(OpsFileCargoPackage)
+            .where(OpsFileCargoPackage.op_id.in_(ops_files_ids))
+            .order_by(OpsFileCargoPackage.package_id)
+        )
+        for package in db.exec(statement).all():
+            packaging[package.op_id].append(package)
+        relations["packaging"] = packaging
+
+    return relations
+
+
+"""
+    Search
+"""
+
+# "fulltext" (Postgres tsvector + pg_trgm), "like" (portable fallback) or "auto" (fulltext on Postgres)
+OPS_SEARCH_BACKEND = os.environ.get("OPS_SEARCH_BACKEND", "auto")
+
+def _search_backend(db: Session) -> str:
+    if OPS_SEARCH_BACKEND != "auto":
+        return OPS_SEARCH_BACKEND
+    return "fulltext" if db.get_bind().dialect.name == "postgresql" else "like"
+
+def _like_pattern(text: str) -> str:
+    escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def _fulltext_search(text: str):
+    """
+        Match and rank expressions backed by the GIN indexes: tsvector over cargo description
+        and comments, trigrams over transport docs and voyage (partial and fuzzy matches)
+    """
+    ts_query = func.websearch_to_tsquery(SEARCH_TS_CONFIG, text)
+    pattern = _like_pattern(text)
+    fuzzy_columns = (OpsFile.master_transport_doc, OpsFile.house_transport_doc, OpsFile.voyage)
+
+    comments_match = exists().where(
+        OpsFileComment.op_id == OpsFile.op_id,
+        ops_file_comment_search_document().op("@@")(ts_query),
+    )
+    match = or_(
+        ops_file_search_document().op("@@")(ts_query),
+        comments_match,
+        *[column.ilike(pattern, escape="\\") for column in fuzzy_columns],
+        *[column.op("%")(text) for column in fuzzy_columns],
+    )
+    rank = func.greatest(
+        func.ts_rank(ops_file_search_document(), ts_query),
+        case((comments_match, 0.05), else_=0),
+        *[func.similarity(column, text) for column in fuzzy_columns],
+    )
+    return match, rank
+
+def _like_search(text: str):
+    """
+        Portable match and rank expressions (no index support, for development and tests)
+    """
+    pattern = _like_pattern(text)
+
+    docs_match = or_(
+        OpsFile.master_transport_doc.ilike(pattern, escape="\\"),
+        OpsFile.house_transport_doc.ilike(pattern, escape="\\"),
+    )
+    voyage_match = OpsFile.voyage.ilike(pattern, escape="\\")
+    description_match = OpsFile.cargo_description.ilike(pattern, escape="\\")
+    comments_match = exists().where(
+        OpsFileComment.op_id == OpsFile.op_id,
+        OpsFileComment.content.ilike(pattern, escape="\\"),
+    )
+
+    match = or_(docs_match, voyage_match, description_match, comments_match)
+    rank = case(
+        (docs_match, literal(3)),
+        (voyage_match, literal(2)),
+        (description_match, literal(1)),
+        else_=literal(0),
+    )
+    return match, rank
+
+
+def ops_files_search_statement(db: Session, text: str, filters: OpsFileFilters, limit: int, offset: int = 0):
+    """
+        Builds the ranked search statement of ops files (best matches first).
+        One extra row is fetched so the caller knows if there is a next page.
+    """
+    if _search_backend(db) == "fulltext":
+        match, rank = _fulltext_search(text)
+    else:
+        match, rank = _like_search(text)
+
+    return (
+        select(OpsFile)
+        .options(*OPS_FILE_LOAD_OPTIONS)
+        .where(match, *ops_files_conditions(filters))
+        .order_by(desc(rank), desc(OpsFile.created_at), desc(OpsFile.op_id))
+        .offset(offset)
+        .limit(limit + 1)
+    )
+
+def search_ops_files(db: Session, text: str, filters: OpsFileFilters, limit: int, offset: int = 0) -> list[OpsFile]:
+    """
+        Ranked search of ops files, up to limit + 1 rows (the extra one tells there is a next page)
+    """
+    return db.exec(ops_files_search_statement(db, text, filters, limit, offset)).all()
+
+
+"""
+    Changes feed
+"""
+
+# Changes younger than this are not returned yet, so rows committed late with
+# an older updated_at (long transactions, clock skew between workers) are not skipped
+CHANGES_SETTLE_DELAY = timedelta(seconds=2)
+
+FEED_BEGINNING = (datetime.min, UUID(int=0))
+
+def ops_files_changes(
+    db: Session,
+    after_update: tuple[datetime, UUID],
+    after_deletion: tuple[datetime, UUID],
+    limit: int,
+) -> tuple[list[OpsFile], list[OpsFileTombstone], bool]:
+    """
+        Ops files created/updated and deleted after the given (updated_at, op_id) and (deleted_at, op_id)
+        positions, oldest first. Returns (changed ops files, tombstones, has more changes)
+    """
+    settled_at = datetime.utcnow() - CHANGES_SETTLE_DELAY
+
+    changed_ops_files = db.exec(
+        select(OpsFile)
+        .options(*OPS_FILE_LOAD_OPTIONS)
+        .where(
+            tuple_(OpsFile.updated_at, OpsFile.op_id) > tuple_(*after_update),
+            OpsFile.updated_at <= settled_at,
+        )
+        .order_by(OpsFile.updated_at, OpsFile.op_id)
+        .limit(limit + 1)
+    ).all()
+
+    tombstones = db.exec(
+        select(OpsFileTombstone)
+        .where(
+            tuple_(OpsFileTombstone.deleted_at, OpsFileTombstone.op_id) > tuple_(*after_deletion),
+            OpsFileTombstone.deleted_at <= settled_at,
+        )
+        .order_by(OpsFileTombstone.deleted_at, OpsFileTombstone.op_id)
+        .limit(limit + 1)
+    ).all()
+
+    has_more = len(changed_ops_files) > limit or len(tombstones) > limit
+    return changed_ops_files[:limit], tombstones[:limit], has_more
@@ -0,0 +1,236 @@
+import csv
+import io
+import json
+import logging
+from datetime import datetime
+from typing import Iterable, Iterator
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.exc import DBAPIError
+from sqlmodel import Session, select
+from app.models.ops_files import OpsFile, OpsFileCreate, OpsFileComment, OpsFileCargoPackage, OpsFileImportResult, OpsFileImportRowError
+from app.models.ops_files_partners import OpsFilePartnerLink
+from app.models.carriers import Carrier
+from app.models.clients import Client
+from app.models.partners import Partner
+from app.models.users import User
+from app.controllers.reference_data import countries, ops_statuses
+
+log = logging.getLogger(__name__)
+
+IMPORT_BATCH_SIZE = 500
+
+# CSV cells holding lists (IDs separated by ";") or JSON values
+CSV_LIST_FIELDS = {"partners_id"}
+CSV_JSON_FIELDS = {"packaging_data"}
+
+
+"""
+    Parsing
+"""
+
+def parse_csv_rows(text: str) -> Iterator[tuple[int, dict | None, str | None]]:
+    """
+        Parse CSV records (header with OpsFileCreate fields names) into (row, data, error) tuples.
+        Empty cells are left unset, "comment" holds the comment content.
+    """
+    reader = csv.DictReader(io.StringIO(text))
+    for row_number, record in enumerate(reader, start=1):
+        try:
+            data = {}
+            for key, value in record.items():
+                if key is None or value is None or value.strip() == "":
+                    continue
+                key, value = key.strip(), value.strip()
+                if key in CSV_LIST_FIELDS:
+                    data[key] = [item.strip() for item in value.split(";") if item.strip()]
+                elif key in CSV_JSON_FIELDS:
+                    data[key] = json.loads(value)
+                elif key == "comment":
+                    data[key] = {"content": value}
+                else:
+                    data[key] = value
+        except json.JSONDecodeError as e:
+            yield row_number, None, f"Invalid JSON value: {e}"
+            continue
+        yield row_number, data, None
+
+def parse_jsonl_rows(text: str) -> Iterator[tuple[int, dict | None, str | None]]:
+    """
+        Parse JSON lines (one OpsFileCreate object per line) into (row, data, error) tuples. Blank lines are skipped
+    """
+    row_number = 0
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        row_number += 1
+        try:
+            data = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield row_number, None, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(data, dict):
+            yield row_number, None, "Invalid JSON: an object is expected"
+            continue
+        yield row_number, data, None
+
+
+"""
+    Import
+"""
+
+def _existing_ids(db: Session, column, ids: set) -> set:
+    """ Single SELECT ... IN returning which of the IDs exist """
+    if not ids:
+        return set()
+    return set(db.exec(select(column).where(column.in_(ids))).all())
+
+def _validation_messages(error: ValidationError) -> list[str]:
+    return [f"{'.'.join(map(str, detail['loc']))}: {detail['msg']}" for detail in error.errors()]
+
+def _missing_references(ops_file: OpsFileCreate, references: dict[str, set]) -> list[str]:
+    """ Errors for the references of an ops file not found in the DB """
+    errors = []
+    if ops_file.client_id not in references["clients"]:
+        errors.append(f"client_id: Client not found ({ops_file.client_id})")
+    if ops_file.status_id not in references["statuses"]:
+        errors.append(f"status_id: Ops status not found ({ops_file.status_id})")
+    if ops_file.carrier_id is not None and ops_file.carrier_id not in references["carriers"]:
+        errors.append(f"carrier_id: Carrier not found ({ops_file.carrier_id})")
+    for field_name in ("origin_country_id", "destination_country_id"):
+        country_id = getattr(ops_file, field_name)
+        if country_id is not None and country_id not in references["countries"]:
+            errors.append(f"{field_name}: Country not found ({country_id})")
+    for field_name in ("creator_user_id", "assignee_user_id"):
+        user_id = getattr(ops_file, field_name)
+        if user_id is not None and user_id not in references["users"]:
+            errors.append(f"{field_name}: User not found ({user_id})")
+    missing_partners_ids = [partner_id for partner_id in ops_file.partners_id or [] if partner_id not in references["partners"]]
+    if missing_partners_ids:
+        errors.append(f"partners_id: Partners not found ({', '.join(map(str, missing_partners_ids))})")
+    if ops_file.comment is not None and ops_file.creator_user_id is None:
+        errors.append("comment: creator_user_id is required to author the comment")
+    return errors
+
+def _resolve_references(db: Session, ops_files: list[OpsFileCreate]) -> dict[str, set]:
+    """ Existing referenced IDs of a batch, one query per referenced table (reference tables are preloaded) """
+    return {
+        "clients": _existing_ids(db, Client.client_id, {ops_file.client_id for ops_file in ops_files}),
+        "statuses": set(ops_statuses.snapshot(db).rows),
+        "carriers": _existing_ids(db, Carrier.carrier_id, {ops_file.carrier_id for ops_file in ops_files} - {None}),
+        "countries": set(countries.snapshot(db).rows),
+        "users": _existing_ids(
+            db, User.user_id,
+            ({ops_file.creator_user_id for ops_file in ops_files} | {ops_file.assignee_user_id for ops_file in ops_files}) - {None},
+        ),
+        "partners": _existing_ids(
+            db, Partner.partner_id,
+            {partner_id for ops_file in ops_files for partner_id in ops_file.partners_id or []},
+        ),
+    }
+
+def _insert_ops_files(db: Session, ops_files: list[OpsFileCreate]):
+    """ Write ops files and their children with one multi-row INSERT per table """
+    now = datetime.utcnow()
+    ops_files_rows, partners_rows, packages_rows, comments_rows = [], [], [], []
+
+    for ops_file in ops_files:
+        db_ops_file = OpsFile.model_validate(ops_file)
+        ops_files_rows.append(db_ops_file.model_dump())
+        for partner_id in dict.fromkeys(ops_file.partners_id or []):
+            partners_rows.append({"op_id": db_ops_file.op_id, "partner_id": partner_id})
+        for package in ops_file.packaging_data or []:
+            packages_rows.append({"op_id": db_ops_file.op_id, "quantity": package.quantity, "units": package.units, "created_at": now})
+        if ops_file.comment is not None:
+            comments_rows.append(
+                OpsFileComment(op_id=db_ops_file.op_id, author_user_id=ops_file.creator_user_id, content=ops_file.comment.content).model_dump()
+            )
+
+    db.execute(insert(OpsFile), ops_files_rows)
+    if partners_rows:
+        db.execute(insert(OpsFilePartnerLink), partners_rows)
+    if packages_rows:
+        db.execute(insert(OpsFileCargoPackage), packages_rows)
+    if comments_rows:
+        db.execute(insert(OpsFileComment), comments_rows)
+
+# Messages of the rows rejected by the DB, by SQLSTATE (the raw error, naming tables and constraints, is only logged)
+DB_ERROR_MESSAGES = {
+    "23505": "Duplicated value of a unique field",
+    "23503": "Referenced record not found",
+    "23502": "Missing required value",
+    "23514": "Value not allowed",
+    "22001": "Value too long",
+    "22003": "Number out of range",
+    "22P02": "Invalid value",
+    "22007": "Invalid date",
+    "22008": "Invalid date",
+}
+DB_ERROR_DEFAULT_MESSAGE = "Rejected by the database"
+
+def _db_error_message(row_number: int, error: DBAPIError) -> str:
+    log.warning(f"Ops files import row {row_number} rejected by the DB: {error.orig}")
+    return DB_ERROR_MESSAGES.get(getattr(error.orig, "pgcode", None), DB_ERROR_DEFAULT_MESSAGE)
+
+def _import_batch(db: Session, batch: list[tuple[int, dict | None, str | None]], result: OpsFileImportResult):
+    valid_rows: list[tuple[int, OpsFileCreate]] = []
+
+    # Validate every row of the batch
+    for row_number, data, error in batch:
+        if error is not None:
+            result.errors.append(OpsFileImportRowError(row=row_number, errors=[error]))
+            continue
+        try:
+            valid_rows.append((row_number, OpsFileCreate.model_validate(data)))
+        except ValidationError as e:
+            result.errors.append(OpsFileImportRowError(row=row_number, errors=_validation_messages(e)))
+
+    # Check the references of the whole batch at once
+    references = _resolve_references(db, [ops_file for _, ops_file in valid_rows])
+    insertable_rows: list[tuple[int, OpsFileCreate]] = []
+    for row_number, ops_file in valid_rows:
+        errors = _missing_references(ops_file, references)
+        if errors:
+            result.errors.append(OpsFileImportRowError(row=row_number, errors=errors))
+        else:
+            insertable_rows.append((row_number, ops_file))
+
+    if not insertable_rows:
+        return
+
+    try:
+        with db.begin_nested():
+            _insert_ops_files(db, [ops_file for _, ops_file in insertable_rows])
+        result.imported += len(insertable_rows)
+    except DBAPIError:
+        # Isolate the rows rejected by the DB (e.g. unique constraints) so the good ones are kept
+        for row_number, ops_file in insertable_rows:
+            try:
+                with db.begin_nested():
+                    _insert_ops_files(db, [ops_file])
+                result.imported += 1
+            except DBAPIError as e:
+                result.errors.append(OpsFileImportRowError(row=row_number, errors=[_db_error_message(row_number, e)]))
+
+    db.commit()
+
+
+def import_ops_files(db: Session, rows: Iterable[tuple[int, dict | None, str | None]]) -> OpsFileImportResult:
+    """
+        Import ops files rows in batches: validation against OpsFileCreate, one lookup per referenced
+        table and multi-row INSERTs per batch. Invalid rows are reported without aborting the others
+    """
+    result = OpsFileImportResult()
+    batch = []
+
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            _import_batch(db, batch, result)
+            batch = []
+    if batch:
+        _import_batch(db, batch, result)
+
+    result.errors.sort(key=lambda row_error: row_error.row)
+    result.failed = len(result.errors)
+    return result
@@ -0,0 +1,93 @@
+import os
+from types import MappingProxyType
+from typing import Any, Iterable, Mapping, NamedTuple
+from sqlmodel import Session, SQLModel, select
+from app.lib.cache import invalidate_on_commit
+from app.lib.etag import make_etag, ETAG_HEADER
+from app.models.geodata import Country, CountryPublic
+from app.models.ops_files import OpsStatus, OpsStatusPublic
+from app.models.carriers import CarrierType, CarrierTypePublic
+from app.models.partners import PartnerType, PartnerTypePublic
+from app.models.users import UserRole, UserRolePublic
+
+# Reference tables barely change, clients may reuse them this long before revalidating with the ETag
+REFERENCE_DATA_MAX_AGE = int(os.environ.get("REFERENCE_DATA_MAX_AGE", "3600"))
+REFERENCE_DATA_CACHE_CONTROL = f"public, max-age={REFERENCE_DATA_MAX_AGE}"
+
+
+class ReferenceSnapshot(NamedTuple):
+    rows: Mapping[Any, SQLModel] # Public models by ID, in display order
+    etag: str
+    lookup: Mapping[str, SQLModel] = MappingProxyType({}) # Public models by upper-cased lookup field value
+
+    @property
+    def headers(self) -> dict[str, str]:
+        return {ETAG_HEADER: self.etag, "Cache-Control": REFERENCE_DATA_CACHE_CONTROL}
+
+    def find(self, value: str) -> SQLModel | None:
+        """ Row whose lookup fields value is the given one, case-insensitive """
+        return self.lookup.get(value.strip().upper())
+
+
+class ReferenceTable:
+    """
+        Per-process read-only copy of a small reference table. The snapshot is loaded at startup,
+        replaced as a whole on reload and dropped after any commit writing the table (reloaded on next use)
+    """
+
+    def __init__(self, model: type[SQLModel], public_model: type[SQLModel], id_field: str, order_by, lookup_fields: tuple[str, ...] = ()):
+        self.model = model
+        self.public_model = public_model
+        self.id_field = id_field
+        self.order_by = order_by
+        # Case-insensitive unique fields (e.g. ISO codes) also indexed in memory, see ReferenceSnapshot.find()
+        self.lookup_fields = lookup_fields
+        self._snapshot: ReferenceSnapshot | None = None
+        invalidate_on_commit(self.invalidate, model)
+
+    def load(self, db: Session) -> ReferenceSnapshot:
+        rows = [self.public_model.model_validate(row) for row in db.exec(select(self.model).order_by(self.order_by)).all()]
+        snapshot = ReferenceSnapshot(
+            rows=MappingProxyType({getattr(row, self.id_field): row for row in rows}),
+            etag=make_etag(*[tuple(row.model_dump().values()) for row in rows]),
+            lookup=MappingProxyType({
+                getattr(row, field_name).upper(): row
+                for field_name in self.lookup_fields for row in rows
+                if getattr(row, field_name) is not None
+            }),
+        )
+        self._snapshot = snapshot
+        return snapshot
+
+    def invalidate(self):
+        self._snapshot = None
+
+    def snapshot(self, db: Session) -> ReferenceSnapshot:
+        """ Current snapshot, loaded with the session if needed (async sessions: `await db.run_sync(table.snapshot)`) """
+        snapshot = self._snapshot
+        if snapshot is None:
+            snapshot = self.load(db)
+        return snapshot
+
+    def missing(self, db: Session, ids: Iterable) -> list:
+        """ IDs not found in the table (None values are ignored) """
+        rows = self.snapshot(db).rows
+        return [id for id in dict.fromkeys(ids) if id is not None and id not in rows]
+
+
+# ISO2 and ISO3 codes never collide (different lengths), so both share the in-memory lookup (no database lookup by code)
+countries = ReferenceTable(Country, CountryPublic, "country_id", order_by=Country.iso2_code, lookup_fields=("iso2_code", "iso3_code"))
+ops_statuses = ReferenceTable(OpsStatus, OpsStatusPublic, "status_id", order_by=OpsStatus.status_id)
+carrier_types = ReferenceTable(CarrierType, CarrierTypePublic, "carrier_type_id", order_by=CarrierType.carrier_type_id)
+partner_types = ReferenceTable(PartnerType, PartnerTypePublic, "partner_type_id", order_by=PartnerType.partner_type_id)
+user_roles = ReferenceTable(UserRole, UserRolePublic, "role_id", order_by=UserRole.role_id)
+
+REFERENCE_TABLES = (countries, ops_statuses, carrier_types, partner_types, user_roles)
+
+
+def load_reference_data(db: Session):
+    """
+        (Re)load every reference table snapshot. Called at startup and by the reload hook
+    """
+    for table in REFERENCE_TABLES:
+        table.load(db)
@@ -0,0 +1,60 @@
+import os
+from sqlmodel import Session, select, func
+from app.lib.cache import TTLCache, invalidate_on_commit
+from app.controllers.reference_data import ops_statuses
+from app.models.ops_files import OpsFile, OpsStatus
+from app.models.carriers import Carrier
+from app.models.clients import Client
+from app.models.partners import Partner
+
+# Ops status considered as closed
+OPS_CLOSED_STATUS_ID = int(os.environ.get("OPS_CLOSED_STATUS_ID", "0"))
+
+# Dashboards poll the statistics, they are shared for a few seconds and dropped on any related write
+OPS_STATISTICS_TTL = float(os.environ.get("OPS_STATISTICS_TTL", "10"))
+
+statistics_cache = TTLCache(ttl=OPS_STATISTICS_TTL)
+invalidate_on_commit(statistics_cache.clear, OpsFile, OpsStatus, Client, Partner, Carrier)
+
+
+def _compute_ops_statistics(db: Session) -> dict:
+    # Names from the in-memory snapshot (loaded at startup), the counts are the only statement
+    statuses = list(ops_statuses.snapshot(db).rows.values())
+
+    # Every count in a single statement (FILTER clauses over one scan of the ops files)
+    statement = select(
+        select(func.count(Client.client_id)).scalar_subquery().label("total_clients"),
+        select(func.count(Partner.partner_id)).scalar_subquery().label("total_partners"),
+        select(func.count(Carrier.carrier_id)).scalar_subquery().label("total_carriers"),
+        func.count(OpsFile.op_id).label("total_ops_files"),
+        func.count(OpsFile.op_id).filter(OpsFile.status_id == OPS_CLOSED_STATUS_ID).label("total_closed_ops_files"),
+        *[
+            func.count(OpsFile.op_id).filter(OpsFile.status_id == status.status_id).label(f"status_{status.status_id}")
+            for status in statuses
+        ],
+    ).select_from(OpsFile)
+
+    counts = db.exec(statement).one()._mapping
+
+    return {
+        "total_clients": counts["total_clients"],
+        "total_partners": counts["total_partners"],
+        "total_carriers": counts["total_carriers"],
+        "total_ops_files": counts["total_ops_files"],
+        "total_closed_ops_files": counts["total_closed_ops_files"],
+        "total_open_ops_files": counts["total_ops_files"] - counts["total_closed_ops_files"],
+        "ops_files_by_status": [
+            {"status_id": status.status_id, "status_name": status.status_name, "total": counts[f"status_{status.status_id}"]}
+            for status in statuses
+        ],
+    }
+
+def get_ops_statistics(db: Session) -> dict:
+    """
+        General statistics of the dashboard, served from the in-process cache when fresh
+    """
+    statistics = statistics_cache.get("ops")
+    if statistics is None:
+        statistics = _compute_ops_statistics(db)
+        statistics_cache.set("ops", statistics)
+    return statistics
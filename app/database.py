@@ -1,17 +1,138 @@
 import os
+import time
 from typing import Annotated
-from fastapi import Depends
-from sqlmodel import SQLModel, create_engine, Session
+from uuid import uuid4
+from fastapi import Depends, Request
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import NullPool
+from sqlmodel import SQLModel, create_engine, Session, text
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.lib.pool import InstrumentedQueuePool, InstrumentedAsyncQueuePool
 
 DATABASE_URL = os.environ.get("DATABASE_URL")
 
-engine = create_engine(DATABASE_URL)
+# Connection pools (each engine, sync and async, has its own pool of this size)
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "30")) # Seconds waiting for a free connection before failing
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", "1800")) # Seconds before a connection is replaced (-1 to disable)
+DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+# Behind PgBouncer (transaction pooling) connections are pooled by PgBouncer: no local pool and
+# no server-side prepared statements cache, they do not survive the server connection switches
+DB_PGBOUNCER = os.environ.get("DB_PGBOUNCER", "false").lower() in ("1", "true", "yes")
+
+def _engine_options(pool_class) -> dict:
+    if DB_PGBOUNCER:
+        return {"poolclass": NullPool, "pool_pre_ping": DB_POOL_PRE_PING}
+    return {
+        "poolclass": pool_class,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+def _async_connect_args() -> dict:
+    if not DB_PGBOUNCER or make_url(ASYNC_DATABASE_URL).get_driver_name() != "asyncpg":
+        return {}
+    return {
+        "statement_cache_size": 0,
+        "prepared_statement_cache_size": 0,
+        # Unique names, a statement prepared by another client may exist on the same server connection
+        "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+    }
+
+engine = create_engine(DATABASE_URL, **_engine_options(InstrumentedQueuePool))
+
+def _async_database_url(database_url: str) -> str:
+    """Same database through the asyncpg driver (e.g. postgresql+psycopg2://... -> postgresql+asyncpg://...)"""
+    url = make_url(database_url)
+    if url.get_backend_name() == "postgresql":
+        url = url.set(drivername="postgresql+asyncpg")
+    return url.render_as_string(hide_password=False)
+
+# Overridable for databases without asyncpg support (e.g. sqlite+aiosqlite:// in development)
+ASYNC_DATABASE_URL = os.environ.get("ASYNC_DATABASE_URL") or _async_database_url(DATABASE_URL)
+
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    connect_args=_async_connect_args(),
+    **_engine_options(InstrumentedAsyncQueuePool),
+)
+
+# Objects stay usable after commit: the responses are serialized once the session is closed,
+# where expired attributes could not be reloaded (no implicit IO with async sessions)
+async_session_maker = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+
+"""
+    Read replica (optional)
+
+    Safe GET handlers use the read sessions, bound to the replica when DATABASE_REPLICA_URL is set.
+    After a write, the client reads from the primary for REPLICA_STICKY_SECONDS (cookie set by the
+    middleware in app/main.py), so it never reads data older than its own writes because of the replica lag.
+"""
+
+DATABASE_REPLICA_URL = os.environ.get("DATABASE_REPLICA_URL")
+REPLICA_STICKY_SECONDS = float(os.environ.get("REPLICA_STICKY_SECONDS", "5"))
+
+# Cookie holding the timestamp until which the client reads from the primary
+PRIMARY_STICKY_COOKIE = "db_primary_until"
+# Header forcing the reads of a request to the primary (e.g. clients not sending cookies)
+READ_PRIMARY_HEADER = "X-Read-Primary"
+
+if DATABASE_REPLICA_URL:
+    read_engine = create_engine(DATABASE_REPLICA_URL, **_engine_options(InstrumentedQueuePool))
+    async_read_engine = create_async_engine(
+        _async_database_url(DATABASE_REPLICA_URL),
+        connect_args=_async_connect_args(),
+        **_engine_options(InstrumentedAsyncQueuePool),
+    )
+    async_read_session_maker = async_sessionmaker(async_read_engine, class_=AsyncSession, expire_on_commit=False)
+else:
+    read_engine, async_read_engine, async_read_session_maker = engine, async_engine, async_session_maker
+
+def reads_from_primary(request: Request) -> bool:
+    if read_engine is engine:
+        return True
+    if request.headers.get(READ_PRIMARY_HEADER, "").lower() in ("1", "true", "yes"):
+        return True
+    try:
+        return float(request.cookies.get(PRIMARY_STICKY_COOKIE, "")) > time.time()
+    except ValueError:
+        return False
 
 def create_db_and_tables():
+    if engine.dialect.name == "postgresql":
+        # Required by the trigram search indexes
+        with engine.begin() as connection:
+            connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
     SQLModel.metadata.create_all(engine)
 
 def get_db():
     with Session(engine) as session:
         yield session
 
-SessionDep = Annotated[Session, Depends(get_db)]
\ No newline at end of file
+SessionDep = Annotated[Session, Depends(get_db)]
+
+async def get_async_db():
+    async with async_session_maker() as session:
+        yield session
+
+# Async handlers reuse the sync controllers with `await db.run_sync(controller, *args)`
+AsyncSessionDep = Annotated[AsyncSession, Depends(get_async_db)]
+
+def get_read_db(request: Request):
+    with Session(engine if reads_from_primary(request) else read_engine) as session:
+        yield session
+
+# Read-only sessions, for safe GET handlers
+ReadSessionDep = Annotated[Session, Depends(get_read_db)]
+
+async def get_async_read_db(request: Request):
+    session_maker = async_session_maker if reads_from_primary(request) else async_read_session_maker
+    async with session_maker() as session:
+        yield session
+
+AsyncReadSessionDep = Annotated[AsyncSession, Depends(get_async_read_db)]
@@ -0,0 +1,80 @@
+import threading
+import time
+from typing import Any, Callable
+from sqlalchemy import event
+from sqlalchemy.orm import Session, ORMExecuteState
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe in-process cache whose entries expire ttl seconds after being set."""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entries: dict[Any, tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            expires_at, value = self._entries.get(key, (0, _MISSING))
+            if value is _MISSING or expires_at <= time.monotonic():
+                self._entries.pop(key, None)
+                return default
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+"""
+    Invalidation on commit
+
+    Sessions record the models written by each transaction (ORM flushes and
+    ORM-enabled bulk INSERT/UPDATE/DELETE statements). Once the transaction is
+    committed, the callbacks watching any of those models are called.
+"""
+
+_CHANGED_MODELS_KEY = "changed_models"
+_watchers: list[tuple[frozenset[type], Callable[[], None]]] = []
+
+
+def invalidate_on_commit(callback: Callable[[], None], *models: type):
+    """Call the callback after every commit that wrote rows of any of the models."""
+    _watchers.append((frozenset(models), callback))
+
+
+@event.listens_for(Session, "after_flush")
+def _record_flushed_models(session: Session, flush_context):
+    changed_models = session.info.setdefault(_CHANGED_MODELS_KEY, set())
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        changed_models.add(type(instance))
+
+@event.listens_for(Session, "do_orm_execute")
+def _record_bulk_models(orm_execute_state: ORMExecuteState):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None:
+            orm_execute_state.session.info.setdefault(_CHANGED_MODELS_KEY, set()).add(mapper.class_)
+
+@event.listens_for(Session, "after_commit")
+def _notify_watchers(session: Session):
+    changed_models = session.info.pop(_CHANGED_MODELS_KEY, None)
+    if not changed_models:
+        return
+    for models, callback in _watchers:
+        if not models.isdisjoint(changed_models):
+            callback()
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_changed_models(session: Session, previous_transaction):
+    # A rolled back SAVEPOINT (begin_nested) keeps the changes of the enclosing transaction, still to be committed
+    # (the models it recorded are kept too: at worst a cache is invalidated once more than needed)
+    if previous_transaction.nested:
+        return
+    session.info.pop(_CHANGED_MODELS_KEY, None)
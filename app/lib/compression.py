@@ -0,0 +1,180 @@
+"""
+    Responses compression
+
+    ASGI middleware compressing the responses with brotli (when the brotli package is
+    installed) or gzip, as negotiated with the Accept-Encoding header (q-values included).
+    Full bodies under COMPRESSION_MIN_SIZE bytes are sent as they are, streaming responses
+    (e.g. the exports) are compressed chunk by chunk and flushed, so they are still delivered
+    progressively. Already encoded responses and compressed content types are skipped.
+"""
+import os
+import zlib
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSION_MIN_SIZE = int(os.environ.get("COMPRESSION_MIN_SIZE", "1024")) # Bytes
+COMPRESSION_GZIP_LEVEL = int(os.environ.get("COMPRESSION_GZIP_LEVEL", "6")) # 1 (fastest) to 9 (smallest)
+COMPRESSION_BROTLI_QUALITY = int(os.environ.get("COMPRESSION_BROTLI_QUALITY", "4")) # 0 to 11, low values suit dynamic responses
+
+# Already compressed formats, or streams that must not be buffered
+SKIPPED_CONTENT_TYPES = (
+    "image/", "video/", "audio/", "font/woff",
+    "application/zip", "application/gzip", "application/x-gzip", "application/x-brotli",
+    "application/zstd", "application/pdf", "application/octet-stream", "text/event-stream",
+)
+
+SKIPPED_STATUS_CODES = {204, 206, 304}
+
+
+def choose_encoding(accept_encoding: str) -> str | None:
+    """Supported encoding with the highest q-value in the Accept-Encoding header (brotli first on ties), if any."""
+    supported = ("br", "gzip") if brotli is not None else ("gzip",)
+    qualities = {}
+    for item in accept_encoding.split(","):
+        coding, *params = [part.strip() for part in item.split(";")]
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding:
+            qualities[coding.lower()] = quality
+
+    best, best_quality = None, 0.0
+    for coding in supported:
+        quality = qualities.get(coding, qualities.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+class _Compressor:
+    """Incremental compressor of a response body."""
+
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=brotli_quality)
+        else:
+            # gzip container (wbits 16 + window size)
+            self._zlib = zlib.compressobj(gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, chunk: bytes, flush: bool = False) -> bytes:
+        """Compresses a chunk. With flush, everything received so far can be decoded by the client."""
+        if self.encoding == "br":
+            return self._brotli.process(chunk) + (self._brotli.flush() if flush else b"")
+        return self._zlib.compress(chunk) + (self._zlib.flush(zlib.Z_SYNC_FLUSH) if flush else b"")
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._brotli.finish()
+        return self._zlib.flush(zlib.Z_FINISH)
+
+
+class CompressionMiddleware:
+    def __init__(
+        self,
+        app,
+        minimum_size: int = COMPRESSION_MIN_SIZE,
+        gzip_level: int = COMPRESSION_GZIP_LEVEL,
+        brotli_quality: int = COMPRESSION_BROTLI_QUALITY,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        await _CompressedResponse(self, encoding, send).run(scope, receive)
+
+
+class _CompressedResponse:
+    """Sender of a single response: the start message is held until the first body chunk tells how to send it."""
+
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, send):
+        self.middleware = middleware
+        self.encoding = encoding
+        self.send = send
+        self.start_message = None
+        self.compressor: _Compressor | None = None
+        self.passthrough = False
+
+    async def run(self, scope, receive):
+        await self.middleware.app(scope, receive, self.send_message)
+
+    def _skipped(self, headers: MutableHeaders) -> bool:
+        content_type = headers.get("content-type", "").lower()
+        return (
+            self.start_message["status"] in SKIPPED_STATUS_CODES
+            or "content-encoding" in headers
+            or "no-transform" in headers.get("cache-control", "").lower()
+            or content_type.startswith(SKIPPED_CONTENT_TYPES)
+        )
+
+    def _set_compressed_headers(self, headers: MutableHeaders, content_length: int | None):
+        headers["Content-Encoding"] = self.encoding
+        headers.add_vary_header("Accept-Encoding")
+        if content_length is None:
+            del headers["Content-Length"]
+        else:
+            headers["Content-Length"] = str(content_length)
+        # The compressed bytes differ from the identity ones, the validator stays usable for weak comparisons
+        etag = headers.get("etag")
+        if etag is not None and not etag.startswith("W/"):
+            headers["ETag"] = f"W/{etag}"
+
+    async def send_message(self, message):
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            return
+
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.compressor is None:
+            headers = MutableHeaders(raw=self.start_message["headers"])
+            if self._skipped(headers) or (not more_body and len(body) < self.middleware.minimum_size):
+                self.passthrough = True
+                await self.send(self.start_message)
+                await self.send(message)
+                return
+
+            self.compressor = _Compressor(self.encoding, self.middleware.gzip_level, self.middleware.brotli_quality)
+            if not more_body:
+                # Full body: compressed at once, with its final length
+                compressed = self.compressor.compress(body) + self.compressor.finish()
+                self._set_compressed_headers(headers, len(compressed))
+                await self.send(self.start_message)
+                await self.send({"type": "http.response.body", "body": compressed})
+                return
+
+            # Streaming body: total length unknown, sent chunked
+            self._set_compressed_headers(headers, None)
+            await self.send(self.start_message)
+
+        if more_body:
+            # Each chunk is flushed, so the client receives the rows as they are produced
+            await self.send({"type": "http.response.body", "body": self.compressor.compress(body, flush=True), "more_body": True})
+        else:
+            compressed = self.compressor.compress(body) + self.compressor.finish()
+            await self.send({"type": "http.response.body", "body": compressed})
@@ -1,25 +1,86 @@
+import asyncio
 import hashlib
+import hmac
 import binascii
 import os
+from concurrent.futures import ThreadPoolExecutor
+
+"""
+    Password hashing
+
+    Passwords are hashed with scrypt, stored as "scrypt$n$r$p$salt$hash" (hex salt and hash).
+    Hashes of previous versions ("salt:sha256") are still verified, needs_rehash() tells
+    when a password should be hashed again with the current parameters (e.g. on login).
+"""
+
+SCRYPT_N = int(os.environ.get("SCRYPT_N", str(2**14))) # CPU/memory cost, power of 2
+SCRYPT_R = int(os.environ.get("SCRYPT_R", "8"))
+SCRYPT_P = int(os.environ.get("SCRYPT_P", "1"))
+SCRYPT_KEY_LENGTH = 32
+
+SCRYPT_PREFIX = "scrypt"
 
 
 def generate_salt() -> bytes:
     """Generates a random salt."""
     return os.urandom(16)  # 16 bytes of random data
 
-def hash_password(password: str, salt: bytes) -> str:
-    """Hashes the password using SHA-256 with the provided salt."""
-    salted_password = salt + password.encode('utf-8')
-    hashed_password = hashlib.sha256(salted_password).hexdigest()
-    return f"{salt.hex()}:{hashed_password}"
+def _scrypt(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    # scrypt needs 128 * n * r * p bytes, above the hashlib default limit for the larger costs
+    return hashlib.scrypt(password.encode("utf-8"), salt=salt, n=n, r=r, p=p, maxmem=2 * 128 * n * r * p, dklen=SCRYPT_KEY_LENGTH)
+
+def hash_password(password: str, salt: bytes | None = None) -> str:
+    """Hashes the password with scrypt and the current cost parameters."""
+    salt = salt if salt is not None else generate_salt()
+    hashed_password = _scrypt(password, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P)
+    return f"{SCRYPT_PREFIX}${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${salt.hex()}${hashed_password.hex()}"
 
-def verify_password(plain_password: str, hashed_password_with_salt: str) -> bool:
-    """Verifies the plain password against the hashed password and salt."""
+def _verify_legacy_password(plain_password: str, hashed_password_with_salt: str) -> bool:
+    """Verifies a "salt:sha256" hash of previous versions."""
+    salt_hex, stored_hash = hashed_password_with_salt.split(':')
+    salt = bytes.fromhex(salt_hex)
+    hashed_attempt = hashlib.sha256(salt + plain_password.encode('utf-8')).hexdigest()
+    return hmac.compare_digest(hashed_attempt, stored_hash)
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    """Verifies the plain password against the stored hash (current or legacy format)."""
     try:
-        salt_hex, stored_hash = hashed_password_with_salt.split(':')
-        salt = bytes.fromhex(salt_hex)
-        hashed_attempt = hashlib.sha256(salt + plain_password.encode('utf-8')).hexdigest()
-        return hashed_attempt == stored_hash
+        if not hashed_password.startswith(f"{SCRYPT_PREFIX}$"):
+            return _verify_legacy_password(plain_password, hashed_password)
+        _, n, r, p, salt_hex, stored_hash = hashed_password.split("$")
+        hashed_attempt = _scrypt(plain_password, bytes.fromhex(salt_hex), int(n), int(r), int(p))
+        return hmac.compare_digest(hashed_attempt, bytes.fromhex(stored_hash))
     except (ValueError, binascii.Error):
         # Handle cases where the stored hash is malformed
-        return False
\ No newline at end of file
+        return False
+
+def needs_rehash(hashed_password: str) -> bool:
+    """Whether the hash is legacy or was made with other cost parameters than the current ones."""
+    parts = hashed_password.split("$")
+    return len(parts) != 6 or parts[0] != SCRYPT_PREFIX or parts[1:4] != [str(SCRYPT_N), str(SCRYPT_R), str(SCRYPT_P)]
+
+
+"""
+    Worker pool
+
+    Hashing costs tens of milliseconds of CPU on purpose. It runs in a bounded pool (hashlib releases
+    the GIL during scrypt) so concurrent logins cannot take every request thread nor stall the event loop.
+"""
+
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1)))
+
+_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+
+
+async def hash_password_async(password: str) -> str:
+    return await asyncio.get_running_loop().run_in_executor(_executor, hash_password, password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await asyncio.get_running_loop().run_in_executor(_executor, verify_password, plain_password, hashed_password)
+
+def hash_password_pooled(password: str) -> str:
+    """Blocking variant for sync handlers: waits for a pool worker, so the concurrency cap also applies to them."""
+    return _executor.submit(hash_password, password).result()
+
+def verify_password_pooled(plain_password: str, hashed_password: str) -> bool:
+    return _executor.submit(verify_password, plain_password, hashed_password).result()
@@ -0,0 +1,85 @@
+"""
+    Sync vs async database benchmark
+
+    Runs concurrent ops files list requests (first page, as GET /ops/ does) through
+    the sync path (Session in the threadpool, limited like the sync handlers by the
+    AnyIO threads limiter) and through the async path (AsyncSession on the event
+    loop), and reports the throughput, the latency percentiles and the pools waits.
+
+    Usage:
+        python -m app.lib.db_benchmark [requests] [concurrency] [page_size]
+"""
+import asyncio
+import statistics
+import sys
+import time
+from fastapi.concurrency import run_in_threadpool
+from sqlmodel import Session
+from app.database import engine, async_engine, async_session_maker
+from app.controllers.ops_files import ops_files_page_versions_statement, get_ops_files_public
+from app.lib.pool import pool_status
+from app.models.ops_files import OpsFileFilters
+
+
+def _sync_page(limit: int) -> int:
+    with Session(engine) as db:
+        versions = db.exec(ops_files_page_versions_statement(OpsFileFilters(), limit)).all()[:limit]
+        return len(get_ops_files_public(db, [version.op_id for version in versions]))
+
+async def sync_request(limit: int) -> int:
+    # What a sync handler does: the whole request holds a threadpool thread
+    return await run_in_threadpool(_sync_page, limit)
+
+async def async_request(limit: int) -> int:
+    # What the async handler does: only the ORM graph loading runs in a greenlet
+    async with async_session_maker() as db:
+        versions = (await db.exec(ops_files_page_versions_statement(OpsFileFilters(), limit))).all()[:limit]
+        ops_files = await db.run_sync(get_ops_files_public, [version.op_id for version in versions])
+        return len(ops_files)
+
+async def _run(request, requests_count: int, concurrency: int, limit: int) -> tuple[float, list[float]]:
+    """Sends `requests_count` requests, at most `concurrency` at once. Returns (duration, latencies)"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one_request():
+        async with semaphore:
+            started_at = time.perf_counter()
+            await request(limit)
+            latencies.append(time.perf_counter() - started_at)
+
+    # Warm up the pool connections before measuring
+    await request(limit)
+    started_at = time.perf_counter()
+    await asyncio.gather(*[one_request() for _ in range(requests_count)])
+    return time.perf_counter() - started_at, latencies
+
+def _percentile(values: list[float], percentile: float) -> float:
+    return statistics.quantiles(values, n=100, method="inclusive")[int(percentile) - 1]
+
+
+async def _main(requests_count: int, concurrency: int, limit: int):
+    print(f"{requests_count} requests, {concurrency} concurrent, {limit} ops files per page")
+    for name, request, pool in (
+        ("sync (threadpool)", sync_request, engine.pool),
+        ("async (event loop)", async_request, async_engine.pool),
+    ):
+        duration, latencies = await _run(request, requests_count, concurrency, limit)
+        status = pool_status(pool)
+        print(
+            f"{name}: {requests_count / duration:.1f} requests/s, "
+            f"p50 {_percentile(latencies, 50) * 1000:.1f} ms, p99 {_percentile(latencies, 99) * 1000:.1f} ms, "
+            f"pool waits max {status.get('wait_max_seconds', 0) * 1000:.1f} ms, timeouts {status.get('timeouts', 0)}"
+        )
+    await async_engine.dispose()
+
+def main(argv: list[str]) -> int:
+    requests_count = int(argv[0]) if len(argv) > 0 else 500
+    concurrency = int(argv[1]) if len(argv) > 1 else 100
+    limit = int(argv[2]) if len(argv) > 2 else 50
+    asyncio.run(_main(requests_count, concurrency, limit))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
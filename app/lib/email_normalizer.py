@@ -0,0 +1,55 @@
+"""
+    Users emails normalizer
+
+    Emails are normalized (app/lib/emails.py) on every write path and the login
+    matches lower(email) on the ux_users_email_lower index, so this command is
+    only a cleanup: it normalizes the emails stored by previous versions (not
+    lower-cased on update) in batches. Emails that would collide with another
+    user once normalized are left as they are and reported, to be merged by
+    hand (they also prevent the creation of the unique index).
+
+    Usage:
+        python -m app.lib.email_normalizer [batch_size]
+"""
+import sys
+from sqlalchemy import update
+from sqlmodel import Session, select
+from app.database import engine
+from app.lib.emails import normalize_email
+from app.models.users import User
+
+
+def normalize_users_emails(session: Session, batch_size: int = 500) -> tuple[int, list[str]]:
+    """Normalize the stored users emails. Returns (number of updated rows, conflicting emails)"""
+    users = session.exec(select(User.user_id, User.email)).all()
+
+    # Python normalization, the same as the write paths (SQL lower() differs for some non-ASCII characters)
+    taken_emails = {email for _, email in users if email == normalize_email(email)}
+    pending = []
+    conflicts = []
+    for user_id, email in users:
+        normalized_email = normalize_email(email)
+        if email == normalized_email:
+            continue
+        if normalized_email in taken_emails:
+            conflicts.append(email)
+            continue
+        taken_emails.add(normalized_email)
+        pending.append((user_id, normalized_email))
+
+    for start in range(0, len(pending), batch_size):
+        for user_id, normalized_email in pending[start:start + batch_size]:
+            session.execute(update(User).where(User.user_id == user_id).values(email=normalized_email))
+        session.commit()
+
+    return len(pending), conflicts
+
+
+if __name__ == "__main__":
+    batch_size = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    with Session(engine) as session:
+        updated_count, conflicts = normalize_users_emails(session, batch_size)
+    print(f"users: {updated_count} emails normalized")
+    for email in conflicts:
+        print(f"Conflict, another user has the normalized email of: {email}")
+    sys.exit(1 if conflicts else 0)
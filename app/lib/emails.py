@@ -0,0 +1,3 @@
+def normalize_email(email: str) -> str:
+    """Canonical form of the stored emails (lowercase, no surrounding spaces), so lookups are exact matches on the unique index."""
+    return str(email).strip().lower()
@@ -0,0 +1,24 @@
+import hashlib
+from fastapi import Request, Response
+
+ETAG_HEADER = "ETag"
+
+
+def make_etag(*parts) -> str:
+    """Strong ETag derived from the given versions parts (IDs, timestamps, counts...)."""
+    digest = hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()
+    return f'"{digest}"'
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Whether the If-None-Match header of the request matches the ETag (weak comparison, as required for GET)."""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = {candidate.strip().removeprefix("W/") for candidate in if_none_match.split(",")}
+    return etag in candidates
+
+def not_modified(etag: str, headers: dict[str, str] | None = None) -> Response:
+    """304 response, the headers (e.g. Cache-Control) are the ones a 200 response would carry."""
+    return Response(status_code=304, headers={**(headers or {}), ETAG_HEADER: etag})
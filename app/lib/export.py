@@ -0,0 +1,24 @@
+import csv
+import io
+import json
+from typing import Iterable, Iterator
+
+
+def csv_chunks(columns: list[str], partitions: Iterable[list[tuple]]) -> Iterator[str]:
+    """Encodes partitions of rows as CSV text, one chunk per partition (header first)."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    writer.writerow(columns)
+    yield buffer.getvalue()
+
+    for rows in partitions:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows)
+        yield buffer.getvalue()
+
+def ndjson_chunks(columns: list[str], partitions: Iterable[list[tuple]]) -> Iterator[str]:
+    """Encodes partitions of rows as newline delimited JSON objects, one chunk per partition."""
+    for rows in partitions:
+        yield "".join(json.dumps(dict(zip(columns, row)), default=str) + "\n" for row in rows)
@@ -0,0 +1,46 @@
+"""
+    Fast JSON responses (opt-in with FAST_JSON)
+
+    The default response class becomes ORJSONResponse (orjson must be installed), and the hot
+    list endpoints skip the response_model round trip (dump, re-validation of every nested
+    *Public model, jsonable_encoder, stdlib json): their already validated models or flat rows
+    are serialized once. The routes keep their response_model, so the OpenAPI schemas are unchanged.
+"""
+import logging
+import os
+from fastapi import Response
+from fastapi.responses import JSONResponse, ORJSONResponse
+from pydantic import TypeAdapter
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+log = logging.getLogger(__name__)
+
+FAST_JSON = os.environ.get("FAST_JSON", "false").lower() in ("1", "true", "yes")
+if FAST_JSON and orjson is None:
+    log.warning("FAST_JSON is set but orjson is not installed, the default JSON response class is kept")
+
+DefaultResponseClass = ORJSONResponse if FAST_JSON and orjson is not None else JSONResponse
+
+JSON_MEDIA_TYPE = "application/json"
+
+
+def models_json(adapter: TypeAdapter, models) -> bytes:
+    """Already validated models, serialized by pydantic (in Rust) without validating them again."""
+    return adapter.dump_json(models)
+
+def rows_json(adapter: TypeAdapter, rows) -> bytes:
+    """
+        Flat DB rows (mappings) whose columns are exactly the fields of the adapter model.
+        orjson serializes them as they are (UUIDs and datetimes included), else they are validated once.
+    """
+    if orjson is not None:
+        return orjson.dumps([dict(row) for row in rows])
+    return adapter.dump_json(adapter.validate_python(rows))
+
+def json_response(content: bytes, headers: dict[str, str] | None = None) -> Response:
+    # Headers set on the injected Response are not applied to a returned Response, they are passed here
+    return Response(content=content, media_type=JSON_MEDIA_TYPE, headers=headers)
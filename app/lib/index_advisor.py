@@ -0,0 +1,192 @@
+"""
+    Index advisor
+
+    Reports foreign key columns and commonly filtered columns that are not
+    covered by any index, either in the declared models metadata or (with --live)
+    in the database pointed by DATABASE_URL. With --live, the DDL creating the
+    declared indexes missing from the database, and dropping the ones the models
+    no longer declare, is printed too, as well as the DDL recreating the foreign
+    keys whose ON DELETE action differs from the models one (create_all() never
+    alters existing constraints, while e.g. the carriers and partners contacts
+    relationships rely on the database ON DELETE CASCADE).
+
+    Usage:
+        python -m app.lib.index_advisor [--live]
+"""
+import sys
+from sqlalchemy import ForeignKeyConstraint, Table, UniqueConstraint, inspect
+from sqlalchemy.schema import CreateIndex
+from sqlmodel import SQLModel
+
+# Register every table in the metadata
+from app.models import analytics, clients, carriers, partners, geodata, ops_files, ops_files_partners, users  # noqa: F401
+
+# Columns used by list filters besides foreign keys, by table full name
+FILTERED_COLUMNS = {
+    "ops.op_files": [
+        "estimated_time_departure",
+        "estimated_time_arrival",
+    ],
+}
+
+# Indexes the models used to declare (by table full name), still present in databases created before
+OBSOLETE_INDEXES = {
+    # Plain unique index of users.email, superseded by ux_users_email_lower (unique and used by the login)
+    "users.users": ["ix_users_users_email"],
+    # ISO codes upper() indexes, the codes are looked up in the countries reference snapshot, never in the database
+    "geodata.countries": ["ux_countries_iso2_code_upper", "ux_countries_iso3_code_upper"],
+}
+
+
+def _is_covered(columns: list[str], indexed_columns: list[list[str]]) -> bool:
+    """Whether the columns are the leading columns of at least one index."""
+    return any(index_columns[:len(columns)] == columns for index_columns in indexed_columns)
+
+def _declared_indexed_columns(table: Table) -> list[list[str]]:
+    """Leading columns of the indexes, primary key and unique constraints declared for a table."""
+    indexed_columns = [[column.name for column in table.primary_key.columns]]
+    for index in table.indexes:
+        indexed_columns.append([column.name for column in index.columns])
+    for constraint in table.constraints:
+        if isinstance(constraint, UniqueConstraint):
+            indexed_columns.append([column.name for column in constraint.columns])
+    for column in table.columns:
+        if column.unique:
+            indexed_columns.append([column.name])
+    return indexed_columns
+
+def _live_indexed_columns(inspector, table: Table) -> list[list[str]]:
+    """Leading columns of the indexes, primary key and unique constraints existing in the database for a table."""
+    indexed_columns = [inspector.get_pk_constraint(table.name, schema=table.schema)["constrained_columns"]]
+    for index in inspector.get_indexes(table.name, schema=table.schema):
+        indexed_columns.append([column for column in index["column_names"] if column is not None])
+    for constraint in inspector.get_unique_constraints(table.name, schema=table.schema):
+        indexed_columns.append(constraint["column_names"])
+    return indexed_columns
+
+def _candidate_columns(table: Table) -> list[tuple[str, list[str]]]:
+    """Columns that should be indexed: foreign keys and commonly filtered columns."""
+    candidates = []
+    for foreign_key in table.foreign_key_constraints:
+        candidates.append(("foreign key", [column.name for column in foreign_key.columns]))
+    for column_name in FILTERED_COLUMNS.get(table.fullname, []):
+        candidates.append(("filter", [column_name]))
+    return candidates
+
+
+def find_unindexed_columns(engine=None) -> list[tuple[str, str, list[str]]]:
+    """
+        List the (table, reason, columns) candidates not covered by an index.
+        The declared metadata is inspected unless an engine is given, then the live database is.
+    """
+    inspector = inspect(engine) if engine is not None else None
+    missing = []
+
+    for table in SQLModel.metadata.sorted_tables:
+        if inspector is not None:
+            if not inspector.has_table(table.name, schema=table.schema):
+                continue
+            indexed_columns = _live_indexed_columns(inspector, table)
+        else:
+            indexed_columns = _declared_indexed_columns(table)
+
+        for reason, columns in _candidate_columns(table):
+            if not _is_covered(columns, indexed_columns):
+                missing.append((table.fullname, reason, columns))
+
+    return missing
+
+def find_missing_declared_indexes(engine) -> list:
+    """List the indexes declared in the models that do not exist in the database yet."""
+    inspector = inspect(engine)
+    missing = []
+
+    for table in SQLModel.metadata.sorted_tables:
+        if not inspector.has_table(table.name, schema=table.schema):
+            continue
+        existing_names = {index["name"] for index in inspector.get_indexes(table.name, schema=table.schema)}
+        for index in table.indexes:
+            if index.name not in existing_names:
+                missing.append(index)
+
+    return missing
+
+def find_obsolete_indexes(engine) -> list[tuple[str, str]]:
+    """List the (schema, index name) of the obsolete indexes still existing in the database."""
+    inspector = inspect(engine)
+    obsolete = []
+
+    for table in SQLModel.metadata.sorted_tables:
+        obsolete_names = OBSOLETE_INDEXES.get(table.fullname)
+        if not obsolete_names or not inspector.has_table(table.name, schema=table.schema):
+            continue
+        existing_names = {index["name"] for index in inspector.get_indexes(table.name, schema=table.schema)}
+        obsolete.extend((table.schema, name) for name in obsolete_names if name in existing_names)
+
+    return obsolete
+
+def _ondelete(action: str | None) -> str:
+    return (action or "NO ACTION").upper()
+
+def find_mismatched_foreign_keys(bind) -> list[tuple[str, ForeignKeyConstraint]]:
+    """
+        List the (live constraint name, declared constraint) of the foreign keys whose ON DELETE action
+        in the database differs from the declared one. The bind is an engine or a connection.
+    """
+    inspector = inspect(bind)
+    mismatched = []
+
+    for table in SQLModel.metadata.sorted_tables:
+        if not inspector.has_table(table.name, schema=table.schema):
+            continue
+        live_foreign_keys = {
+            tuple(foreign_key["constrained_columns"]): foreign_key
+            for foreign_key in inspector.get_foreign_keys(table.name, schema=table.schema)
+        }
+        for constraint in table.foreign_key_constraints:
+            live_foreign_key = live_foreign_keys.get(tuple(column.name for column in constraint.columns))
+            if live_foreign_key is None:
+                continue
+            if _ondelete(live_foreign_key["options"].get("ondelete")) != _ondelete(constraint.ondelete):
+                mismatched.append((live_foreign_key["name"], constraint))
+
+    return mismatched
+
+def alter_foreign_key_ddl(name: str, constraint: ForeignKeyConstraint) -> str:
+    """Single statement replacing a live foreign key with the declared one (same name)."""
+    columns = ", ".join(column.name for column in constraint.columns)
+    referred_columns = ", ".join(element.column.name for element in constraint.elements)
+    return (
+        f"ALTER TABLE {constraint.table.fullname} DROP CONSTRAINT {name}, "
+        f"ADD CONSTRAINT {name} FOREIGN KEY ({columns}) "
+        f"REFERENCES {constraint.referred_table.fullname} ({referred_columns}) ON DELETE {_ondelete(constraint.ondelete)};"
+    )
+
+
+def main(argv: list[str]) -> int:
+    engine = None
+    if "--live" in argv:
+        from app.database import engine
+
+    missing_columns = find_unindexed_columns(engine)
+    for table_name, reason, columns in missing_columns:
+        print(f"[{reason}] {table_name}({', '.join(columns)}) is not covered by any index")
+
+    if engine is not None:
+        # create_all() does not add indexes to existing tables, so print the DDL to apply them
+        for index in find_missing_declared_indexes(engine):
+            ddl = str(CreateIndex(index, if_not_exists=True).compile(dialect=engine.dialect))
+            print(f"{ddl.strip()};")
+        for schema, index_name in find_obsolete_indexes(engine):
+            print(f"DROP INDEX IF EXISTS {schema}.{index_name};")
+        for name, constraint in find_mismatched_foreign_keys(engine):
+            print(alter_foreign_key_ddl(name, constraint))
+
+    if not missing_columns:
+        print("Every foreign key and filtered column is covered by an index")
+
+    return 1 if missing_columns else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,73 @@
+"""
+    JSON responses benchmark
+
+    Serializes a list of client-like rows through the default response path
+    (response_model re-validation, jsonable_encoder and stdlib json, as FastAPI
+    does) and through the fast paths of app/lib/fast_json.py, and reports the
+    time per response.
+
+    Usage:
+        python -m app.lib.json_benchmark [rows] [repeats]
+"""
+import json
+import sys
+import time
+from datetime import datetime, timedelta
+from uuid import uuid4
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+from app.lib.fast_json import models_json, rows_json, orjson
+from app.models.clients import ClientPublic
+
+clients_adapter = TypeAdapter(list[ClientPublic])
+
+
+def _rows(count: int) -> list[dict]:
+    created_at = datetime(2024, 1, 1)
+    return [
+        {
+            "name": f"Client {i}",
+            "tax_id": f"J-{i:08d}",
+            "address": f"{i} Main Street, Suite {i % 100}",
+            "contact_name": f"Contact {i}",
+            "contact_phone": f"+58 212 {i:07d}",
+            "contact_email": f"contact{i}@example.com",
+            "disabled": i % 10 == 0,
+            "client_id": uuid4(),
+            "created_at": created_at + timedelta(minutes=i),
+        }
+        for i in range(count)
+    ]
+
+def _default_path(rows: list[dict]) -> bytes:
+    # Validation of the returned content against the response_model, then jsonable_encoder and json.dumps
+    validated = clients_adapter.validate_python(rows)
+    content = jsonable_encoder(clients_adapter.dump_python(validated, mode="python"))
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+def _time(function, repeats: int) -> float:
+    started_at = time.perf_counter()
+    for _ in range(repeats):
+        function()
+    return (time.perf_counter() - started_at) / repeats
+
+
+def main(argv: list[str]) -> int:
+    count = int(argv[0]) if len(argv) > 0 else 500
+    repeats = int(argv[1]) if len(argv) > 1 else 50
+
+    rows = _rows(count)
+    models = clients_adapter.validate_python(rows)
+
+    print(f"{count} rows, {repeats} repeats{'' if orjson is not None else ' (orjson not installed)'}")
+    for name, function in (
+        ("response_model + json", lambda: _default_path(rows)),
+        ("validated models dump_json", lambda: models_json(clients_adapter, models)),
+        ("rows (orjson)" if orjson is not None else "rows (validate + dump_json)", lambda: rows_json(clients_adapter, rows)),
+    ):
+        print(f"{name}: {_time(function, repeats) * 1000:.2f} ms per response")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
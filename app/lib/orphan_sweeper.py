@@ -0,0 +1,42 @@
+"""
+    Orphan contacts sweeper
+
+    Contacts are deleted with their carrier/partner (delete-orphan cascade and
+    ON DELETE CASCADE), this command only cleans up the orphan contacts left
+    in the DB by previous versions. It runs in small batches outside the
+    request path.
+
+    Usage:
+        python -m app.lib.orphan_sweeper [batch_size]
+"""
+import sys
+from sqlalchemy import delete
+from sqlmodel import Session, select
+from app.database import engine
+from app.models.carriers import CarrierContact
+from app.models.partners import PartnerContact
+
+
+def sweep_orphans(session: Session, model, primary_key, foreign_key, batch_size: int = 500) -> int:
+    """Delete the rows of a model whose foreign key is NULL in batches. Returns the number of deleted rows."""
+    total_deleted = 0
+    while True:
+        batch = select(primary_key).where(foreign_key.is_(None)).limit(batch_size)
+        result = session.execute(delete(model).where(primary_key.in_(batch)))
+        session.commit()
+        total_deleted += result.rowcount
+        if result.rowcount < batch_size:
+            return total_deleted
+
+def sweep_orphan_contacts(batch_size: int = 500) -> dict[str, int]:
+    with Session(engine) as session:
+        return {
+            "carrier_contacts": sweep_orphans(session, CarrierContact, CarrierContact.carrier_contact_id, CarrierContact.carrier_id, batch_size),
+            "partner_contacts": sweep_orphans(session, PartnerContact, PartnerContact.partner_contact_id, PartnerContact.partner_id, batch_size),
+        }
+
+
+if __name__ == "__main__":
+    batch_size = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    for table_name, deleted_count in sweep_orphan_contacts(batch_size).items():
+        print(f"{table_name}: {deleted_count} orphan rows deleted")
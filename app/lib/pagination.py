@@ -0,0 +1,45 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from uuid import UUID
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def _encode_value(value) -> str | int | None:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, UUID):
+        return str(value)
+    return value
+
+def _decode_value(value, value_type):
+    # Encoded as strings (UUID(5) or UUID([1]) would raise AttributeError instead of ValueError)
+    if value_type in (datetime, UUID) and not isinstance(value, str):
+        raise ValueError("Malformed cursor value")
+    if value_type is datetime:
+        return datetime.fromisoformat(value)
+    return value_type(value)
+
+def encode_cursor(*values) -> str:
+    """Encodes the keyset position values (e.g. created_at and id of the last row) into an opaque cursor."""
+    raw = json.dumps([_encode_value(value) for value in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str, *value_types) -> tuple:
+    """Decodes an opaque cursor into a tuple of values of the given types. Raises ValueError if malformed."""
+    try:
+        padding = "=" * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode((cursor + padding).encode("ascii"))
+        values = json.loads(raw)
+    except (binascii.Error, UnicodeError, json.JSONDecodeError) as e:
+        raise ValueError("Malformed cursor") from e
+
+    if not isinstance(values, list) or len(values) != len(value_types):
+        raise ValueError("Malformed cursor")
+
+    try:
+        return tuple(_decode_value(value, value_type) for value, value_type in zip(values, value_types))
+    except (TypeError, ValueError) as e:
+        raise ValueError("Malformed cursor") from e
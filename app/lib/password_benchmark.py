@@ -0,0 +1,62 @@
+"""
+    Password hashing benchmark
+
+    Runs concurrent login-like password verifications through the bounded
+    workers pool (as the login handler does) and reports the throughput and
+    latency percentiles, for the current scrypt parameters and the legacy hash.
+
+    Usage:
+        python -m app.lib.password_benchmark [attempts] [concurrency]
+"""
+import asyncio
+import hashlib
+import statistics
+import sys
+import time
+from app.lib.crypto import hash_password, verify_password_async, generate_salt, PASSWORD_HASH_WORKERS, SCRYPT_N, SCRYPT_R, SCRYPT_P
+
+PASSWORD = "correct horse battery staple"
+
+
+def _legacy_hash(password: str) -> str:
+    salt = generate_salt()
+    return f"{salt.hex()}:{hashlib.sha256(salt + password.encode('utf-8')).hexdigest()}"
+
+async def _run(hashed_password: str, attempts: int, concurrency: int) -> tuple[float, list[float]]:
+    """Verifies the password `attempts` times, at most `concurrency` at once. Returns (duration, latencies)"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def attempt():
+        async with semaphore:
+            started_at = time.perf_counter()
+            assert await verify_password_async(PASSWORD, hashed_password)
+            latencies.append(time.perf_counter() - started_at)
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*[attempt() for _ in range(attempts)])
+    return time.perf_counter() - started_at, latencies
+
+def _percentile(values: list[float], percentile: float) -> float:
+    return statistics.quantiles(values, n=100, method="inclusive")[int(percentile) - 1]
+
+
+def main(argv: list[str]) -> int:
+    attempts = int(argv[0]) if len(argv) > 0 else 200
+    concurrency = int(argv[1]) if len(argv) > 1 else 50
+
+    print(f"{attempts} attempts, {concurrency} concurrent, {PASSWORD_HASH_WORKERS} workers")
+    for name, hashed_password in (
+        (f"scrypt (n={SCRYPT_N}, r={SCRYPT_R}, p={SCRYPT_P})", hash_password(PASSWORD)),
+        ("legacy sha256", _legacy_hash(PASSWORD)),
+    ):
+        duration, latencies = asyncio.run(_run(hashed_password, attempts, concurrency))
+        print(
+            f"{name}: {attempts / duration:.1f} logins/s, "
+            f"p50 {_percentile(latencies, 50) * 1000:.1f} ms, p99 {_percentile(latencies, 99) * 1000:.1f} ms"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
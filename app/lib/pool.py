@@ -0,0 +1,77 @@
+import threading
+import time
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import Pool, QueuePool, AsyncAdaptedQueuePool
+
+
+class PoolStats:
+    """Thread-safe counters of the connections checkouts of a pool and of the time spent waiting for them."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record(self, wait: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_total_seconds": round(self.wait_total, 6),
+                "wait_avg_seconds": round(self.wait_total / self.checkouts, 6) if self.checkouts else 0.0,
+                "wait_max_seconds": round(self.wait_max, 6),
+            }
+
+
+class _InstrumentedPoolMixin:
+    """
+        Times _do_get(), the part of a checkout that waits for a free connection (or opens a new one),
+        so pool exhaustion can be told apart from slow queries
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def _do_get(self):
+        started_at = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.stats.record(time.perf_counter() - started_at, timed_out=True)
+            raise
+        self.stats.record(time.perf_counter() - started_at)
+        return connection
+
+class InstrumentedQueuePool(_InstrumentedPoolMixin, QueuePool):
+    pass
+
+class InstrumentedAsyncQueuePool(_InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def pool_status(pool: Pool) -> dict:
+    """Current usage of a pool, plus the checkouts stats of the instrumented ones."""
+    status = {"pool_class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update({
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+        })
+    stats = getattr(pool, "stats", None)
+    if isinstance(stats, PoolStats):
+        status.update(stats.as_dict())
+    return status
@@ -0,0 +1,46 @@
+import base64
+import binascii
+import hashlib
+import hmac
+import json
+import time
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def _b64decode(value: str) -> bytes:
+    padding = "=" * (-len(value) % 4)
+    return base64.urlsafe_b64decode((value + padding).encode("ascii"))
+
+def _signature(payload: str, secret: bytes) -> str:
+    return _b64encode(hmac.new(secret, payload.encode("ascii"), hashlib.sha256).digest())
+
+
+def sign_token(claims: dict, secret: bytes) -> str:
+    """Encodes the claims (JSON serializable, "exp" as a UNIX timestamp) into a "payload.signature" HMAC-SHA256 token."""
+    payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode("utf-8"))
+    return f"{payload}.{_signature(payload, secret)}"
+
+def read_token(token: str, secret: bytes) -> dict:
+    """Decodes the claims of a token after checking its signature and expiration. Raises ValueError if invalid."""
+    try:
+        payload, signature = token.split(".")
+        expected_signature = _signature(payload, secret)
+    except (ValueError, UnicodeError) as e:
+        raise ValueError("Malformed token") from e
+
+    # Headers are decoded as latin-1: a non-ASCII signature is invalid (compare_digest only takes ASCII strings)
+    if not signature.isascii() or not hmac.compare_digest(signature, expected_signature):
+        raise ValueError("Invalid token signature")
+
+    try:
+        claims = json.loads(_b64decode(payload))
+    except (binascii.Error, UnicodeError, json.JSONDecodeError) as e:
+        raise ValueError("Malformed token") from e
+
+    if not isinstance(claims, dict) or not isinstance(claims.get("exp"), (int, float)):
+        raise ValueError("Malformed token")
+    if claims["exp"] <= time.time():
+        raise ValueError("Expired token")
+    return claims
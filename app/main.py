@@ -1,11 +1,24 @@
 from typing import Union
+import asyncio
+import math
 import os
+import time
 
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, Depends
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from sqlmodel import Session
 
 from app.routers import clients, carriers, ops_files, geodata, users, auth, partners
-from app.database import create_db_and_tables
+from app.database import create_db_and_tables, engine, async_engine, read_engine, async_read_engine, SessionDep, PRIMARY_STICKY_COOKIE, REPLICA_STICKY_SECONDS
+from app.controllers.analytics import refresh_volume_rollups, OPS_ROLLUPS_REFRESH_INTERVAL
+from app.controllers.reference_data import load_reference_data
+from app.controllers.auth import require_token, refresh_revoked_users, REVOKED_USERS_REFRESH_INTERVAL
+from app.lib.pagination import NEXT_CURSOR_HEADER
+from app.lib.etag import ETAG_HEADER
+from app.lib.pool import pool_status
+from app.lib.fast_json import DefaultResponseClass
+from app.lib.compression import CompressionMiddleware
 from contextlib import asynccontextmanager
 
 import logging
@@ -13,11 +26,27 @@ import logging
 log = logging.getLogger(__name__)
 
 
+def _run_with_session(job):
+    with Session(engine) as session:
+        job(session)
+
+async def run_periodically(job, interval: float):
+    """ Run a background job (sync function taking a DB session) every interval seconds, off the event loop """
+    while True:
+        try:
+            await run_in_threadpool(_run_with_session, job)
+        except Exception as e:
+            log.exception(f"Failed to run {job.__name__} {e}")
+        await asyncio.sleep(interval)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     try: 
         log.debug('Initializing...')
         create_db_and_tables()
+        with Session(engine) as session:
+            load_reference_data(session)
         log.debug('Initialization finished!')
         pass
         #await defaults.load_default_parameters()
@@ -26,9 +55,22 @@ async def lifespan(app: FastAPI):
     
     except Exception as e:
         log.exception(f"Failed to initialized DB {e}")
+
+    periodic_tasks = []
+    if OPS_ROLLUPS_REFRESH_INTERVAL > 0:
+        periodic_tasks.append(asyncio.create_task(run_periodically(refresh_volume_rollups, OPS_ROLLUPS_REFRESH_INTERVAL)))
+    if REVOKED_USERS_REFRESH_INTERVAL > 0:
+        periodic_tasks.append(asyncio.create_task(run_periodically(refresh_revoked_users, REVOKED_USERS_REFRESH_INTERVAL)))
     
     yield 
 
+    for task in periodic_tasks:
+        task.cancel()
+
+    await async_engine.dispose()
+    if async_read_engine is not async_engine:
+        await async_read_engine.dispose()
+
     # Shutdown logic
     print("Shutting down...")
     # Clean up resources here (e.g., close database connections, stop tasks)
@@ -38,6 +80,7 @@ async def lifespan(app: FastAPI):
 
 app = FastAPI(title='PinOps - API', 
               lifespan=lifespan,
+              default_response_class=DefaultResponseClass,
               redoc_url=None, version="1.0.0", 
               swagger_ui_parameters={"docExpansion": "none"})
 
@@ -50,8 +93,28 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, ETAG_HEADER],
 )
 
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+@app.middleware("http")
+async def stick_to_primary_after_writes(request: Request, call_next):
+    """ Clients read from the primary for a while after their writes (see the read replica in app/database.py) """
+    response = await call_next(request)
+    if read_engine is not engine and request.method not in SAFE_METHODS and response.status_code < 400:
+        response.set_cookie(
+            PRIMARY_STICKY_COOKIE,
+            str(time.time() + REPLICA_STICKY_SECONDS),
+            max_age=math.ceil(REPLICA_STICKY_SECONDS),
+            httponly=True,
+            samesite="lax",
+        )
+    return response
+
+# Outermost: compresses the final responses (gzip, or brotli if installed), see app/lib/compression.py
+app.add_middleware(CompressionMiddleware)
+
 # @app.middleware("http")
 # async def middleware(request: Request, call_next):
 #     log.info(f'[{request.method}] {request.url}')
@@ -66,6 +129,24 @@ app.include_router(partners.router)
 app.include_router(carriers.router)
 app.include_router(ops_files.router)
 
+@app.post("/reference-data/reload", dependencies=[Depends(require_token)])
+def reload_reference_data(db: SessionDep):
+    """ Reload the countries, statuses, types and roles held in memory (e.g. after editing them in the DB) """
+    load_reference_data(db)
+    return {"ok": True}
+
+@app.get("/stats/db-pool", dependencies=[Depends(require_token)])
+def read_db_pool_stats():
+    """ Connections in use and checkouts wait times of the DB pools, to tell pool exhaustion apart from slow queries """
+    stats = {
+        "sync": pool_status(engine.pool),
+        "async": pool_status(async_engine.pool),
+    }
+    if read_engine is not engine:
+        stats["replica_sync"] = pool_status(read_engine.pool)
+        stats["replica_async"] = pool_status(async_read_engine.pool)
+    return stats
+
 @app.get("/")
 def read_root():
     return {"Hello": "World"}
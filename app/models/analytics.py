@@ -0,0 +1,53 @@
+from datetime import date, datetime
+from sqlmodel import SQLModel, Field
+from sqlalchemy import Index
+from uuid import UUID
+from typing import Optional
+
+SCHEMA_NAME = "ops"
+
+"""
+    Ops files volume rollups (refreshed in background, see app/controllers/analytics.py)
+"""
+
+class OpsVolumeRollup(SQLModel, table=True):
+    __tablename__ = "op_files_volume_rollups"
+    __table_args__ = (
+        Index("ix_op_files_volume_rollups_granularity_bucket_start", "granularity", "bucket_start"),
+        {"schema": SCHEMA_NAME},
+    )
+
+    rollup_id: Optional[int] = Field(default=None, primary_key=True)
+
+    granularity: str = Field(max_length=10) # "week" or "month"
+    bucket_start: date # Creation date truncated to the granularity
+
+    # Dimensions
+    op_type: Optional[str] = Field(default=None, max_length=100)
+    client_id: Optional[UUID] = Field(default=None)
+    carrier_id: Optional[UUID] = Field(default=None)
+    origin_country_id: Optional[int] = Field(default=None)
+    destination_country_id: Optional[int] = Field(default=None)
+
+    # Measures
+    ops_count: int = Field(default=0)
+    gross_weight_kg: float = Field(default=0) # Weights in other units are converted, unknown units are ignored
+    volume_m3: float = Field(default=0) # Volumes in other units are converted, unknown units are ignored
+
+class RollupWatermark(SQLModel, table=True):
+    __tablename__ = "rollup_watermarks"
+    __table_args__ = {"schema": SCHEMA_NAME}
+
+    name: str = Field(primary_key=True, max_length=50)
+    watermark: datetime
+
+class OpsVolumeBucket(SQLModel):
+    bucket_start: date
+    op_type: Optional[str] = None
+    client_id: Optional[UUID] = None
+    carrier_id: Optional[UUID] = None
+    origin_country_id: Optional[int] = None
+    destination_country_id: Optional[int] = None
+    ops_count: int
+    gross_weight_kg: float
+    volume_m3: float
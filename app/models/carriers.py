@@ -50,14 +50,16 @@ class Carrier(CarrierBase, table=True):
     carrier_id: UUID = Field(default_factory=uuid4, primary_key=True, sa_column_kwargs={"name": "carrier_id"})
 
     # Foreign keys
-    carrier_type_id: str = Field(foreign_key=f"{SCHEMA_NAME}.carrier_types.carrier_type_id", nullable=False)
+    carrier_type_id: str = Field(foreign_key=f"{SCHEMA_NAME}.carrier_types.carrier_type_id", nullable=False, index=True)
 
     created_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
-    updated_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
+    updated_at: datetime = Field(default_factory=datetime.utcnow, nullable=False, sa_column_kwargs={"onupdate": datetime.utcnow})
 
     # Relationships
     carrier_type: CarrierType = Relationship(back_populates="carriers")
-    carrier_contacts: List["CarrierContact"] = Relationship(back_populates="carrier")
+    # Contacts removed from the list are deleted in the same flush, carrier deletion is cascaded by the DB
+    # (databases created before the ON DELETE CASCADE: apply the DDL printed by `make index-advisor`)
+    carrier_contacts: List["CarrierContact"] = Relationship(back_populates="carrier", cascade_delete=True, passive_deletes=True)
     ops_files: Optional[List["OpsFile"]] = Relationship(back_populates="carrier") 
 
 class CarrierPublic(CarrierBase):
@@ -100,10 +102,10 @@ class CarrierContact(CarrierContactBase, table=True):
     carrier_contact_id: UUID = Field(default_factory=uuid4, primary_key=True, sa_column_kwargs={"name": "carrier_contact_id"})
 
     # Foreign keys
-    carrier_id: UUID = Field(foreign_key=f"{SCHEMA_NAME}.carriers.carrier_id", nullable=False)
+    carrier_id: UUID = Field(foreign_key=f"{SCHEMA_NAME}.carriers.carrier_id", nullable=False, index=True, ondelete='CASCADE')
 
     created_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
-    updated_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
+    updated_at: datetime = Field(default_factory=datetime.utcnow, nullable=False, sa_column_kwargs={"onupdate": datetime.utcnow})
 
     # Relationships
     carrier: Carrier = Relationship(back_populates="carrier_contacts")
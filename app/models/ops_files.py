@@ -1,4 +1,5 @@
 from sqlmodel import SQLModel, Field, Relationship
+from sqlalchemy import Index, func, literal_column
 from app.models.clients import Client, ClientPublic
 from app.models.carriers import Carrier, CarrierPublic
 from app.models.partners import Partner, PartnerPublic
@@ -70,21 +71,31 @@ class OpsFileBase(SQLModel):
     
 class OpsFile(OpsFileBase, table=True):
     __tablename__ = "op_files"
-    __table_args__ = {"schema": SCHEMA_NAME} 
+    __table_args__ = (
+        # Backs the keyset pagination of the ops files list (newest first)
+        Index("ix_op_files_created_at_op_id", "created_at", "op_id"),
+        # Backs the changes feed
+        Index("ix_op_files_updated_at_op_id", "updated_at", "op_id"),
+        # Schedules range filters
+        Index("ix_op_files_estimated_time_departure", "estimated_time_departure"),
+        Index("ix_op_files_estimated_time_arrival", "estimated_time_arrival"),
+        {"schema": SCHEMA_NAME},
+    )
 
     op_id: UUID = Field(default_factory=uuid4, primary_key=True, sa_column_kwargs={"name": "op_id"})
 
     # Foreign keys
-    client_id: UUID = Field(foreign_key="clients.clients.client_id")
-    status_id: int = Field(foreign_key="ops.op_status.status_id")
-    carrier_id: Optional[UUID] = Field(foreign_key="carriers.carriers.carrier_id", default=None, sa_column_kwargs={"name": "carrier_id"}, ondelete='SET NULL')
-    creator_user_id: Optional[UUID] = Field(foreign_key="users.users.user_id", default=None, sa_column_kwargs={"name": "creator_user_id"}, ondelete='SET NULL')
-    assignee_user_id: Optional[UUID] = Field(foreign_key="users.users.user_id", default=None, sa_column_kwargs={"name": "asignee_user_id"}, ondelete='SET NULL')
-    origin_country_id: Optional[int] = Field(foreign_key="geodata.countries.country_id", default=None, sa_column_kwargs={"name": "origin_country_id"}, ondelete='SET NULL')
-    destination_country_id: Optional[int] = Field(foreign_key="geodata.countries.country_id", default=None, sa_column_kwargs={"name": "destination_country_id"}, ondelete='SET NULL')
+    client_id: UUID = Field(foreign_key="clients.clients.client_id", index=True)
+    status_id: int = Field(foreign_key="ops.op_status.status_id", index=True)
+    carrier_id: Optional[UUID] = Field(foreign_key="carriers.carriers.carrier_id", default=None, sa_column_kwargs={"name": "carrier_id"}, ondelete='SET NULL', index=True)
+    creator_user_id: Optional[UUID] = Field(foreign_key="users.users.user_id", default=None, sa_column_kwargs={"name": "creator_user_id"}, ondelete='SET NULL', index=True)
+    assignee_user_id: Optional[UUID] = Field(foreign_key="users.users.user_id", default=None, sa_column_kwargs={"name": "asignee_user_id"}, ondelete='SET NULL', index=True)
+    origin_country_id: Optional[int] = Field(foreign_key="geodata.countries.country_id", default=None, sa_column_kwargs={"name": "origin_country_id"}, ondelete='SET NULL', index=True)
+    destination_country_id: Optional[int] = Field(foreign_key="geodata.countries.country_id", default=None, sa_column_kwargs={"name": "destination_country_id"}, ondelete='SET NULL', index=True)
 
     created_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
-    updated_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
+    # Also bumped on comments and packaging changes (see app/controllers/ops_files.py touch_ops_file)
+    updated_at: datetime = Field(default_factory=datetime.utcnow, nullable=False, sa_column_kwargs={"onupdate": datetime.utcnow})
     
     # Relationships
     client: Client = Relationship(back_populates="ops_files")
@@ -92,7 +103,7 @@ class OpsFile(OpsFileBase, table=True):
     carrier: Optional[Carrier] = Relationship(back_populates="ops_files") 
     partners: Optional[List[Partner]] = Relationship(back_populates="ops_files", link_model=OpsFilePartnerLink) 
     comments: List["OpsFileComment"] = Relationship(back_populates="ops_file", cascade_delete=True)   
-    packaging: List["OpsFileCargoPackage"] = Relationship(back_populates="ops_file", cascade_delete=True)
+    packaging: List["OpsFileCargoPackage"] = Relationship(back_populates="ops_file", cascade_delete=True, sa_relationship_kwargs={"order_by": "OpsFileCargoPackage.package_id"})
     creator: Optional[User] = Relationship(back_populates="created_ops_files",  sa_relationship_kwargs={"foreign_keys": "[OpsFile.creator_user_id]"})
     assignee: Optional[User] = Relationship(back_populates="assigned_ops_files", sa_relationship_kwargs={"foreign_keys": "[OpsFile.assignee_user_id]"})
     origin_country: Optional[Country] = Relationship(back_populates="ops_files_origins", sa_relationship_kwargs={"foreign_keys": "[OpsFile.origin_country_id]"})
@@ -107,7 +118,9 @@ class OpsFilePublic(OpsFileBase):
     carrier: Optional[CarrierPublic] = None
     partners: Optional[List[PartnerPublic]] = []
     
-    comments: Optional[List["OpsFileCommentPublic"]] = []
+    # Comments are paginated apart (GET /ops/{op_id}/comments/), only their count and the last one are embedded
+    comment_count: int = 0
+    last_comment: Optional["OpsFileCommentPublic"] = None
 
     creator: Optional[UserPublic] = None
     assignee: Optional[UserPublic] = None
@@ -156,6 +169,75 @@ class OpsFileUpdate(OpsFileBase):
     # Other properties
     packaging_data: Optional[List["OpsFileCargoPackageCreateWithoutOpId"]] = None
 
+class OpsFileFilters(SQLModel):
+    status_id: Optional[int] = None
+    client_id: Optional[UUID] = None
+    assignee_user_id: Optional[UUID] = None
+    op_type: Optional[Literal["maritime", "air", "road", "train", "other"]] = None
+    origin_country_id: Optional[int] = None
+    destination_country_id: Optional[int] = None
+    # Schedules ranges (inclusive)
+    etd_from: Optional[date] = None
+    etd_to: Optional[date] = None
+    eta_from: Optional[date] = None
+    eta_to: Optional[date] = None
+
+class OpsFileSummary(SQLModel):
+    """ Lightweight row of the ops files table view """
+    op_id: UUID
+    op_type: Optional[str] = None
+    master_transport_doc: Optional[str] = None
+    house_transport_doc: Optional[str] = None
+    client_id: UUID
+    client_name: str
+    status_id: int
+    status_name: str
+    estimated_time_departure: Optional[date] = None
+    estimated_time_arrival: Optional[date] = None
+    assignee_user_id: Optional[UUID] = None
+    assignee_name: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+    # Heavy relations (only present when expanded)
+    comments: Optional[List["OpsFileCommentPublic"]] = None
+    partners: Optional[List[PartnerPublic]] = None
+    packaging: Optional[List["OpsFileCargoPackagePublic"]] = None
+
+class OpsFileImportRowError(SQLModel):
+    row: int # 1-based data row (CSV header and blank lines are not counted)
+    errors: List[str]
+
+class OpsFileImportResult(SQLModel):
+    imported: int = 0
+    failed: int = 0
+    errors: List[OpsFileImportRowError] = []
+
+"""
+    Ops files tombstones (deleted files, for the changes feed)
+"""
+
+class OpsFileTombstone(SQLModel, table=True):
+    __tablename__ = "op_file_tombstones"
+    __table_args__ = (
+        Index("ix_op_file_tombstones_deleted_at_op_id", "deleted_at", "op_id"),
+        {"schema": SCHEMA_NAME},
+    )
+
+    op_id: UUID = Field(primary_key=True) # No FK, the ops file does not exist anymore
+    created_at: datetime # Creation of the deleted ops file
+    deleted_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
+
+class OpsFileTombstonePublic(SQLModel):
+    op_id: UUID
+    deleted_at: datetime
+
+class OpsFileChanges(SQLModel):
+    created: List[OpsFilePublic] = []
+    updated: List[OpsFilePublic] = []
+    deleted: List[OpsFileTombstonePublic] = []
+    next_cursor: str # To be sent as "since" on the next call
+    has_more: bool # True if the next call would return more changes right away
+
 """
     Ops file cargo packages
 """
@@ -170,7 +252,7 @@ class OpsFileCargoPackage(OpsFileCargoPackageBase, table=True):
 
     package_id: int = Field(primary_key=True, sa_column_kwargs={"name": "package_id"})
     
-    op_id: UUID = Field(foreign_key="ops.op_files.op_id")
+    op_id: UUID = Field(foreign_key="ops.op_files.op_id", index=True)
 
     created_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
     
@@ -206,13 +288,17 @@ class OpsFileCommentBase(SQLModel):
 
 class OpsFileComment(OpsFileCommentBase, table=True):
     __tablename__ = "op_file_comments"
-    __table_args__ = {"schema": SCHEMA_NAME}     
+    __table_args__ = (
+        # Backs the comments pagination (newest first), the counts and the last comment of each ops file
+        Index("ix_op_file_comments_op_id_created_at", "op_id", "created_at"),
+        {"schema": SCHEMA_NAME},
+    )
 
     comment_id: UUID = Field(default_factory=uuid4, primary_key=True, sa_column_kwargs={"name": "comment_id"})
     
     # Foreign keys
     op_id: UUID = Field(foreign_key="ops.op_files.op_id")
-    author_user_id: UUID = Field(foreign_key="users.users.user_id")
+    author_user_id: UUID = Field(foreign_key="users.users.user_id", index=True)
 
     created_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
     
@@ -237,3 +323,36 @@ class OpsFileCommentCreate(OpsFileCommentCreateWithoutOpId):
 class OpsFileCommentUpdate(OpsFileCommentBase):
     author_user_id: Optional[UUID] = None
     content: Optional[str] = None
+
+
+"""
+    Search indexes (Postgres only, the LIKE fallback search works without them)
+"""
+
+# Text search configuration shared by the indexes and the queries. The expressions are rendered
+# with inline literals because they must be identical to the indexed ones for the indexes to be used
+SEARCH_TS_CONFIG = literal_column("'simple'")
+
+def ops_file_search_document():
+    return func.to_tsvector(SEARCH_TS_CONFIG, func.coalesce(OpsFile.cargo_description, literal_column("''")))
+
+def ops_file_comment_search_document():
+    return func.to_tsvector(SEARCH_TS_CONFIG, OpsFileComment.content)
+
+Index(
+    "ix_op_files_search_document", ops_file_search_document(),
+    postgresql_using="gin",
+).ddl_if(dialect="postgresql")
+
+Index(
+    "ix_op_file_comments_search_document", ops_file_comment_search_document(),
+    postgresql_using="gin",
+).ddl_if(dialect="postgresql")
+
+# Trigram indexes (pg_trgm) for partial and fuzzy matches on transport docs and voyage
+for _column in (OpsFile.master_transport_doc, OpsFile.house_transport_doc, OpsFile.voyage):
+    Index(
+        f"ix_op_files_{_column.key}_trgm", _column,
+        postgresql_using="gin",
+        postgresql_ops={_column.key: "gin_trgm_ops"},
+    ).ddl_if(dialect="postgresql")
@@ -13,4 +13,5 @@ class OpsFilePartnerLink(SQLModel, table=True):
     __table_args__ = {"schema": SCHEMA_NAME} 
 
     op_id: UUID | None = Field(default=None, foreign_key="ops.op_files.op_id", primary_key=True, ondelete='CASCADE')
-    partner_id: UUID | None = Field(default=None, foreign_key="partners.partners.partner_id", primary_key=True, ondelete='CASCADE')
+    # The primary key covers lookups by op_id, this index covers the reverse direction (by partner)
+    partner_id: UUID | None = Field(default=None, foreign_key="partners.partners.partner_id", primary_key=True, ondelete='CASCADE', index=True)
@@ -53,15 +53,17 @@ class Partner(PartnerBase, table=True):
     partner_id: UUID = Field(default_factory=uuid4, primary_key=True, sa_column_kwargs={"name": "partner_id"})
 
     # Foreign keys
-    partner_type_id: str = Field(foreign_key=f"{SCHEMA_NAME}.partner_types.partner_type_id", nullable=False)
-    country_id: Optional[int] = Field(foreign_key=f"geodata.countries.country_id", default=None)
+    partner_type_id: str = Field(foreign_key=f"{SCHEMA_NAME}.partner_types.partner_type_id", nullable=False, index=True)
+    country_id: Optional[int] = Field(foreign_key=f"geodata.countries.country_id", default=None, index=True)
 
     created_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
-    updated_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
+    updated_at: datetime = Field(default_factory=datetime.utcnow, nullable=False, sa_column_kwargs={"onupdate": datetime.utcnow})
 
     # Relationships
     partner_type: PartnerType = Relationship(back_populates="partners")
-    partner_contacts: List["PartnerContact"] = Relationship(back_populates="partner")
+    # Contacts removed from the list are deleted in the same flush, partner deletion is cascaded by the DB
+    # (databases created before the ON DELETE CASCADE: apply the DDL printed by `make index-advisor`)
+    partner_contacts: List["PartnerContact"] = Relationship(back_populates="partner", cascade_delete=True, passive_deletes=True)
     country: Optional[Country] = Relationship(back_populates="partners")
     ops_files: Optional[List["OpsFile"]] = Relationship(back_populates="partners", link_model=OpsFilePartnerLink) 
 
@@ -108,10 +110,10 @@ class PartnerContact(PartnerContactBase, table=True):
     partner_contact_id: UUID = Field(default_factory=uuid4, primary_key=True, sa_column_kwargs={"name": "partner_contact_id"})
 
     # Foreign keys
-    partner_id: UUID = Field(foreign_key=f"{SCHEMA_NAME}.partners.partner_id", nullable=False)
+    partner_id: UUID = Field(foreign_key=f"{SCHEMA_NAME}.partners.partner_id", nullable=False, index=True, ondelete='CASCADE')
 
     created_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
-    updated_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
+    updated_at: datetime = Field(default_factory=datetime.utcnow, nullable=False, sa_column_kwargs={"onupdate": datetime.utcnow})
 
     # Relationships
     partner: Partner = Relationship(back_populates="partner_contacts")
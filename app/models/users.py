@@ -1,5 +1,6 @@
 from datetime import datetime
 from sqlmodel import SQLModel, Field, Relationship
+from sqlalchemy import Index, func
 from uuid import UUID, uuid4
 from typing import List, Optional
 
@@ -37,7 +38,7 @@ class UserRoleUpdate(UserRoleBase):
 
 class UserBase(SQLModel):
     name: str = Field(max_length=255)
-    email: str = Field(max_length=255, unique=True, index=True)
+    email: str = Field(max_length=255) # Unique case-insensitively, see ux_users_email_lower below
     disabled: bool = Field(default=False)
 
 class User(UserBase, table=True):
@@ -58,6 +59,10 @@ class User(UserBase, table=True):
     assigned_ops_files: Optional[List["OpsFile"]] = Relationship(back_populates="assignee", sa_relationship_kwargs={"foreign_keys": "[OpsFile.assignee_user_id]"})
     ops_files_comments: Optional[List["OpsFileComment"]] = Relationship(back_populates="author") 
 
+# Case-insensitive uniqueness of the emails, also backs the lower(email) = :email login lookup
+# (rows stored before the emails were normalized on every write included)
+Index("ux_users_email_lower", func.lower(User.email), unique=True)
+
 
 class UserPublic(UserBase):
     user_id: UUID
@@ -77,3 +82,15 @@ class UserUpdate(UserBase):
 class UserLogin(SQLModel):
     email: str
     password: str
+
+class UserLoginPublic(UserPublic):
+    access_token: str
+    token_type: str = "bearer"
+    expires_at: datetime
+
+class UserTokenClaims(SQLModel):
+    """ Identity carried by a verified access token (no DB lookup) """
+    user_id: UUID
+    role_id: Optional[str] = None
+    issued_at: datetime
+    expires_at: datetime
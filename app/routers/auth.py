@@ -1,8 +1,9 @@
 from fastapi import APIRouter,  HTTPException
-from sqlmodel import select, func
-from app.database import SessionDep
-from app.models.users import User, UserPublic, UserLogin
-from app.lib.crypto import verify_password
+from app.database import AsyncSessionDep
+from app.models.users import UserLogin, UserLoginPublic
+from app.lib.emails import normalize_email
+from app.lib.crypto import hash_password, hash_password_async, verify_password_async, needs_rehash
+from app.controllers.auth import issue_access_token, user_by_email_statement
 
 router = APIRouter(
     prefix="/auth",
@@ -11,18 +12,32 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
-@router.post("/login", response_model=UserPublic)
-def login(user: UserLogin, db: SessionDep):
-    email = user.email.lower().strip()
+# Verified when the email is unknown, so the response time does not tell which emails exist
+_UNKNOWN_USER_HASH = hash_password("")
 
-    db_user = db.exec(select(User).where(func.lower(User.email) == email)).first()
+@router.post("/login", response_model=UserLoginPublic)
+async def login(user: UserLogin, db: AsyncSessionDep):
+    email = normalize_email(user.email)
+
+    # The role is part of UserPublic, it cannot be lazy loaded by the serialization
+    db_user = (await db.exec(user_by_email_statement(email))).first()
 
     if not db_user:
+        await verify_password_async(user.password, _UNKNOWN_USER_HASH)
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
-    is_valid_password = verify_password(user.password, db_user.hashed_password)
+    # Hashing runs in the bounded password workers pool, off the event loop
+    is_valid_password = await verify_password_async(user.password, db_user.hashed_password)
     
     if not is_valid_password:
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
-    return db_user
+    # Legacy hashes (or hashes made with older cost parameters) are upgraded now that the password is known
+    if needs_rehash(db_user.hashed_password):
+        db_user.hashed_password = await hash_password_async(user.password)
+        db.add(db_user)
+        await db.commit()
+
+    # Following requests are authorized by the token alone (see app/controllers/auth.py require_token)
+    access_token, expires_at = issue_access_token(db_user)
+    return UserLoginPublic.model_validate(db_user, update={"access_token": access_token, "expires_at": expires_at})
@@ -1,15 +1,20 @@
-from fastapi import APIRouter,  HTTPException
-from sqlmodel import select, desc
+from datetime import datetime
+from fastapi import APIRouter, Depends,  HTTPException, Request, Response
+from sqlmodel import select, desc, func
+from sqlalchemy import update
 from sqlalchemy.orm import selectinload
-from app.database import SessionDep
-from app.models.carriers import CarrierTypePublic, CarrierType, Carrier, CarrierPublic, CarrierCreate, CarrierUpdate, CarrierContact  , CarrierContactCreate, CarrierContactPublic, CarrierContactUpdate, CarrierContactCreateBase
+from app.database import SessionDep, ReadSessionDep
+from app.controllers.auth import require_token
+from app.lib.etag import make_etag, etag_matches, not_modified, ETAG_HEADER
+from app.controllers.reference_data import carrier_types
+from app.models.carriers import CarrierTypePublic, Carrier, CarrierPublic, CarrierCreate, CarrierUpdate, CarrierContact  , CarrierContactCreate, CarrierContactPublic, CarrierContactUpdate, CarrierContactCreateBase
 from uuid import UUID
 from typing import List
 
 router = APIRouter(
     prefix="/carriers",
     tags=["carriers"],
-    dependencies=[],#[Depends(get_token_header)], # TODO add token auth
+    dependencies=[Depends(require_token)],
     responses={404: {"description": "Not found"}},
 )
 
@@ -18,23 +23,47 @@ router = APIRouter(
 """
 
 @router.get("/types", response_model=List[CarrierTypePublic]) 
-def read_carrier_types(db: SessionDep):
-    carrier_types = db.exec(select(CarrierType)).all()
-    return carrier_types
+def read_carrier_types(db: ReadSessionDep, request: Request, response: Response):
+    types = carrier_types.snapshot(db)
+    if etag_matches(request, types.etag):
+        return not_modified(types.etag, types.headers)
+    response.headers.update(types.headers)
+    return list(types.rows.values())
 
 @router.get("/types/{carrier_type_id}/", response_model=CarrierTypePublic)
-def read_carrier_type(carrier_type_id: str, db: SessionDep):
-    carrier_type = db.get(CarrierType, carrier_type_id)
+def read_carrier_type(carrier_type_id: str, db: ReadSessionDep, request: Request, response: Response):
+    types = carrier_types.snapshot(db)
+    carrier_type = types.rows.get(carrier_type_id)
     if not carrier_type:
         raise HTTPException(status_code=404, detail="Carrier type not found")
+    if etag_matches(request, types.etag):
+        return not_modified(types.etag, types.headers)
+    response.headers.update(types.headers)
     return carrier_type
 
 """ 
     Carrier routes
 """
 
+def _touch_carriers(db: SessionDep, carriers_ids: set):
+    """ Bump the carriers updated_at after a change of their contacts, embedded in the carriers (and ops files) payloads """
+    carriers_ids = {carrier_id for carrier_id in carriers_ids if carrier_id is not None}
+    if carriers_ids:
+        db.execute(update(Carrier).where(Carrier.carrier_id.in_(carriers_ids)).values(updated_at=datetime.utcnow()))
+
+def _carriers_version(db: SessionDep, carrier_id: UUID | None = None) -> tuple:
+    """ Count and last update of the carriers (or of a single one) and of their contacts, enough to fingerprint the responses """
+    carriers = select(func.count(Carrier.carrier_id), func.max(Carrier.updated_at))
+    contacts = select(func.count(CarrierContact.carrier_contact_id), func.max(CarrierContact.updated_at))
+    if carrier_id is not None:
+        carriers = carriers.where(Carrier.carrier_id == carrier_id)
+        contacts = contacts.where(CarrierContact.carrier_id == carrier_id)
+    return (*db.exec(carriers).one(), *db.exec(contacts).one())
+
 @router.post("/", response_model=CarrierPublic)
 def create_carrier(carrier: CarrierCreate, db: SessionDep):
+    if carrier_types.missing(db, [carrier.carrier_type_id]):
+        raise HTTPException(status_code=404, detail="Carrier type not found")
     db_carrier = Carrier.model_validate(carrier)
     # Obtained generated carrier ID
     carrier_id = db_carrier.carrier_id
@@ -56,16 +85,27 @@ def create_carrier(carrier: CarrierCreate, db: SessionDep):
     return db_carrier
 
 @router.get("/", response_model=List[CarrierPublic]) 
-def read_carriers(db: SessionDep):
+def read_carriers(db: ReadSessionDep, request: Request, response: Response):
+    etag = make_etag(*_carriers_version(db))
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    response.headers[ETAG_HEADER] = etag
     carriers = db.exec(select(Carrier).order_by(desc(Carrier.created_at))).all()
     return carriers
 
 @router.get("/{carrier_id}/", response_model=CarrierPublic)
-def read_carrier(carrier_id: UUID, db: SessionDep):
-    carrier = db.get(Carrier, carrier_id)
-    if not carrier:
+def read_carrier(carrier_id: UUID, db: ReadSessionDep, request: Request, response: Response):
+    carriers_count, *version = _carriers_version(db, carrier_id)
+    if not carriers_count:
         raise HTTPException(status_code=404, detail="Carrier not found")
-    return carrier
+
+    etag = make_etag(*version)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    response.headers[ETAG_HEADER] = etag
+    return db.get(Carrier, carrier_id)
 
 
 @router.patch("/{carrier_id}/", response_model=CarrierPublic)
@@ -81,13 +121,17 @@ def update_carrier(carrier_id: UUID, carrier: CarrierUpdate, db: SessionDep):
         raise HTTPException(status_code=404, detail="Carrier not found")
 
     carrier_data = carrier.model_dump(exclude_unset=True)
+    if carrier_types.missing(db, [carrier_data.get("carrier_type_id")]):
+        raise HTTPException(status_code=404, detail="Carrier type not found")
     carrier_db.sqlmodel_update(carrier_data)
     
     provided_contacts = carrier_data.get('carrier_contacts')
     # Manage new contacts list if provided
     if provided_contacts is not None:
-        # Reset current contacts list
+        # Reset current contacts list (removed contacts become orphans and are deleted)
         carrier_db.carrier_contacts.clear()
+        # Delete them before inserting the new ones, contacts names are unique
+        db.flush()
         
         # Iterate on new contacts list and Add contacts instances to carrier instance
         for contact_obtained_data in provided_contacts:
@@ -102,19 +146,11 @@ def update_carrier(carrier_id: UUID, carrier: CarrierUpdate, db: SessionDep):
                 mobile=contact_data.mobile,
             )
             carrier_db.carrier_contacts.append(db_contact)
-    # Hackaround: the previous code leaves orphan contacts in DB. Therefore it is required to remove them
-    
-    # Query for all orphan contacts
-    statement = select(CarrierContact).where(CarrierContact.carrier_id == None)
-    orphan_contacts = db.exec(statement).all()
-
-    if not orphan_contacts:
-        orphan_contacts=[]
 
-    # Delete each orphan contact found
-    for contact in orphan_contacts:
-        db.delete(contact)
+        # Contacts changes alone do not touch the carrier row, bump it so its ETag changes
+        carrier_db.updated_at = datetime.utcnow()
 
+    # Replaced contacts are deleted on flush (delete-orphan cascade)
     db.add(carrier_db)
     db.commit()
     db.refresh(carrier_db)
@@ -139,24 +175,25 @@ def delete_carrier(carrier_id: UUID, db: SessionDep):
 def create_carrier_contact(carrier_contact: CarrierContactCreate, db: SessionDep):
     db_carrier_contact = CarrierContact.model_validate(carrier_contact)
     db.add(db_carrier_contact)
+    _touch_carriers(db, {db_carrier_contact.carrier_id})
     db.commit()
     db.refresh(db_carrier_contact)
     return db_carrier_contact
 
 @router.get("/contacts", response_model=List[CarrierContactPublic]) 
-def read_carriers_contacts(db: SessionDep):
+def read_carriers_contacts(db: ReadSessionDep):
     carrier_contacts = db.exec(select(CarrierContact).order_by(desc(CarrierContact.created_at))).all()
     return carrier_contacts
 
 @router.get("/contacts/{contact_id}/", response_model=CarrierContactPublic)
-def read_carrier_contact(contact_id: UUID, db: SessionDep):
+def read_carrier_contact(contact_id: UUID, db: ReadSessionDep):
     carrier_contact = db.get(CarrierContact, contact_id)
     if not carrier_contact:
         raise HTTPException(status_code=404, detail="Carrier contact not found")
     return carrier_contact
 
 @router.get("/contacts/carrier/{carrier_id}/", response_model=List[CarrierContactPublic])
-def read_carrier_contacts_by_carrier(carrier_id: UUID, db: SessionDep):   
+def read_carrier_contacts_by_carrier(carrier_id: UUID, db: ReadSessionDep):   
     carrier = db.get(Carrier, carrier_id)
     if not carrier:
         raise HTTPException(status_code=404, detail="Carrier not found")
@@ -173,8 +210,11 @@ def update_carrier_contact(contact_id: UUID, carrier_contact: CarrierContactUpda
     if not carrier_contact_db:
         raise HTTPException(status_code=404, detail="Carrier contact not found")
     carrier_contact_data = carrier_contact.model_dump(exclude_unset=True)
+    previous_carrier_id = carrier_contact_db.carrier_id
     carrier_contact_db.sqlmodel_update(carrier_contact_data)
     db.add(carrier_contact_db)
+    # Both carriers when the contact is moved
+    _touch_carriers(db, {previous_carrier_id, carrier_contact_db.carrier_id})
     db.commit()
     db.refresh(carrier_contact_db)
     return carrier_contact_db
@@ -186,5 +226,6 @@ def delete_carrier_contact(contact_id: UUID, db: SessionDep):
     if not carrier_contact:
         raise HTTPException(status_code=404, detail="Carrier contact not found")
     db.delete(carrier_contact)
+    _touch_carriers(db, {carrier_contact.carrier_id})
     db.commit()
     return {"ok": True} 
@@ -1,55 +1,78 @@
-from fastapi import APIRouter,  HTTPException
+from fastapi import APIRouter, Depends,  HTTPException, Request, Response
+from pydantic import TypeAdapter
 from sqlmodel import select, desc
-from app.database import SessionDep
+from app.database import AsyncSessionDep, AsyncReadSessionDep
+from app.controllers.auth import require_token
 from app.models.clients import Client, ClientPublic, ClientCreate, ClientUpdate
+from app.lib.etag import make_etag, etag_matches, not_modified, ETAG_HEADER
+from app.lib.fast_json import FAST_JSON, rows_json, json_response
 from uuid import UUID
 
 router = APIRouter(
     prefix="/clients",
     tags=["clients"],
-    dependencies=[],#[Depends(get_token_header)], # TODO add token auth
+    dependencies=[Depends(require_token)],
     responses={404: {"description": "Not found"}},
 )
 
+_clients_adapter = TypeAdapter(list[ClientPublic])
+
 @router.post("/", response_model=ClientPublic)
-def create_client(client: ClientCreate, db: SessionDep):
+async def create_client(client: ClientCreate, db: AsyncSessionDep):
     db_client = Client.model_validate(client)
     db.add(db_client)
-    db.commit()
-    db.refresh(db_client)
+    await db.commit()
+    await db.refresh(db_client)
     return db_client
 
 @router.get("/", response_model=list[ClientPublic]) 
-def read_clients(db: SessionDep):
-    clients = db.exec(select(Client).order_by(desc(Client.created_at))).all()
+async def read_clients(db: AsyncReadSessionDep, request: Request, response: Response):
+    # Clients are flat rows: plain columns are enough for both the ETag and the response
+    clients = (await db.exec(select(*Client.__table__.columns).order_by(desc(Client.created_at)))).mappings().all()
+
+    etag = make_etag(*[tuple(client.values()) for client in clients])
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    # The columns are the ClientPublic fields, the rows are serialized directly
+    if FAST_JSON:
+        return json_response(rows_json(_clients_adapter, clients), {ETAG_HEADER: etag})
+
+    response.headers[ETAG_HEADER] = etag
     return clients
 
 @router.get("/{client_id}/", response_model=ClientPublic)
-def read_client(client_id: UUID, db: SessionDep):
-    client = db.get(Client, client_id)
+async def read_client(client_id: UUID, db: AsyncReadSessionDep, request: Request, response: Response):
+    client = await db.get(Client, client_id)
     if not client:
         raise HTTPException(status_code=404, detail="Client not found")
+
+    etag = make_etag(tuple(client.model_dump().values()))
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    response.headers[ETAG_HEADER] = etag
     return client
 
 
 @router.patch("/{client_id}/", response_model=ClientPublic)
-def update_client(client_id: UUID, client: ClientUpdate, db: SessionDep):
-    client_db = db.get(Client, client_id)
+async def update_client(client_id: UUID, client: ClientUpdate, db: AsyncSessionDep):
+    client_db = await db.get(Client, client_id)
     if not client_db:
         raise HTTPException(status_code=404, detail="Client not found")
     client_data = client.model_dump(exclude_unset=True)
     client_db.sqlmodel_update(client_data)
     db.add(client_db)
-    db.commit()
-    db.refresh(client_db)
+    await db.commit()
+    await db.refresh(client_db)
     return client_db
 
 
 @router.delete("/{client_id}/")
-def delete_client(client_id: UUID, db: SessionDep):
-    client = db.get(Client, client_id)
+async def delete_client(client_id: UUID, db: AsyncSessionDep):
+    client = await db.get(Client, client_id)
     if not client:
         raise HTTPException(status_code=404, detail="Client not found")
-    db.delete(client)
-    db.commit()
+    await db.delete(client)
+    await db.commit()
     return {"ok": True} 
\ No newline at end of file
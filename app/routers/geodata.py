@@ -1,36 +1,55 @@
-from fastapi import APIRouter,  HTTPException
-from sqlmodel import select, asc, func
-from app.database import SessionDep
-from app.models.geodata import Country, CountryPublic
+from fastapi import APIRouter, Depends,  HTTPException, Request, Response, Body
+from typing import Annotated, Optional
+from app.database import AsyncSessionDep, AsyncReadSessionDep
+from app.controllers.auth import require_token
+from app.models.geodata import CountryPublic
+from app.controllers.reference_data import countries as countries_table
+from app.lib.etag import etag_matches, not_modified
 
 router = APIRouter(
     prefix="/geodata",
     tags=["geodata"],
-    dependencies=[],#[Depends(get_token_header)], # TODO add token auth
+    dependencies=[Depends(require_token)],
     responses={404: {"description": "Not found"}},
 )
 
 @router.get("/countries/", response_model=list[CountryPublic]) 
-def read_countries(db: SessionDep):
-    countries = db.exec(select(Country).order_by(asc(Country.iso2_code))).all()
-    return countries
+async def read_countries(db: AsyncReadSessionDep, request: Request, response: Response):
+    countries = await db.run_sync(countries_table.snapshot)
+    if etag_matches(request, countries.etag):
+        return not_modified(countries.etag, countries.headers)
+    response.headers.update(countries.headers)
+    return list(countries.rows.values())
 
 @router.get("/countries/{country_id}/", response_model=CountryPublic)
-def read_country(country_id: int, db: SessionDep):
-    country = db.get(Country, country_id)
+async def read_country(country_id: int, db: AsyncReadSessionDep, request: Request, response: Response):
+    countries = await db.run_sync(countries_table.snapshot)
+    country = countries.rows.get(country_id)
     if not country:
         raise HTTPException(status_code=404, detail="Country not found")
+    if etag_matches(request, countries.etag):
+        return not_modified(countries.etag, countries.headers)
+    response.headers.update(countries.headers)
     return country
 
 
 @router.get("/countries/iso/{iso_code}/", response_model=CountryPublic)
-def read_country(iso_code: str, db: SessionDep):
-    country = db.exec(select(Country)
-                      .where(
-                          (func.lower(Country.iso2_code) == iso_code.lower() )
-                          | (func.lower(Country.iso3_code) == iso_code.lower())
-                        )
-                      ).first()
+async def read_country_by_iso_code(iso_code: str, db: AsyncReadSessionDep, request: Request, response: Response):
+    # ISO2 or ISO3 code, case-insensitive, resolved from the in-memory lookup
+    countries = await db.run_sync(countries_table.snapshot)
+    country = countries.find(iso_code)
     if not country:
         raise HTTPException(status_code=404, detail="Country not found")
-    return country
\ No newline at end of file
+    if etag_matches(request, countries.etag):
+        return not_modified(countries.etag, countries.headers)
+    response.headers.update(countries.headers)
+    return country
+
+@router.post("/countries/iso/", response_model=dict[str, Optional[CountryPublic]])
+async def read_countries_by_iso_codes(iso_codes: Annotated[list[str], Body(max_length=10000)], db: AsyncSessionDep):
+    """
+        Resolve many ISO2 or ISO3 codes at once (e.g. a whole import file).
+        Every given code is a key of the result, null when not found
+    """
+    countries = await db.run_sync(countries_table.snapshot)
+    return {iso_code: countries.find(iso_code) for iso_code in iso_codes}
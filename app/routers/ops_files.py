@@ -1,47 +1,69 @@
-from fastapi import APIRouter, HTTPException
-from sqlmodel import select, func, desc
-from app.database import SessionDep
-from app.models.partners import Partner
-from app.models.ops_files import OpsStatus, OpsStatusPublic, OpsFile, OpsFilePublic, OpsFileCreate, OpsFileUpdate, OpsFileComment, OpsFileCommentPublic, OpsFileCommentCreate, OpsFileCommentUpdate, OpsFileCargoPackage, OpsFileCargoPackageCreateWithoutOpId, OpsFileCommentBase
-from app.models.carriers import Carrier
-from app.models.clients import Client
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter
+from sqlmodel import Session, select
+from app.database import SessionDep, AsyncSessionDep, AsyncReadSessionDep, read_engine
+from app.controllers.auth import require_token
+from app.models.ops_files import OpsStatusPublic, OpsFile, OpsFilePublic, OpsFileCreate, OpsFileUpdate, OpsFileFilters, OpsFileSummary, OpsFileImportResult, OpsFileChanges, OpsFileComment, OpsFileCommentPublic, OpsFileCommentCreate, OpsFileCommentUpdate, OpsFileCommentBase
+from app.controllers.ops_files import ops_files_page_versions_statement, ops_file_version_statement, ops_files_public, get_ops_file_public, get_ops_files_public, ops_file_comments_page_statement, ops_file_comment_statement, ops_files_summary_statement, search_ops_files, ops_files_export_statement, load_ops_files_relations, delete_ops_file_with_tombstone, touch_ops_file, ops_files_changes, FEED_BEGINNING, find_missing_partners_ids, insert_ops_file_partners, insert_ops_file_packaging, sync_ops_file_partners, sync_ops_file_packaging
+from app.controllers.statistics import get_ops_statistics
+from app.controllers.analytics import ops_volume_statement
+from app.models.analytics import OpsVolumeBucket
+from app.controllers.ops_files_import import import_ops_files as import_ops_files_rows, parse_csv_rows, parse_jsonl_rows
+from app.lib.pagination import encode_cursor, decode_cursor, NEXT_CURSOR_HEADER
+from app.lib.export import csv_chunks, ndjson_chunks
+from app.lib.etag import make_etag, etag_matches, not_modified, ETAG_HEADER
+from app.lib.fast_json import FAST_JSON, models_json, json_response
+from app.controllers.reference_data import ops_statuses, countries
+from datetime import datetime, date
+from typing import Annotated, Optional, Literal
 from uuid import UUID
 
 router = APIRouter(
     prefix="/ops",
     tags=["ops files"],
-    dependencies=[],#[Depends(get_token_header)], # TODO add token auth
+    dependencies=[Depends(require_token)],
     responses={404: {"description": "Not found"}},
 )
 
+_ops_files_adapter = TypeAdapter(list[OpsFilePublic])
+
+
+def _decode_page_cursor(cursor: Optional[str]) -> Optional[tuple[datetime, UUID]]:
+    if cursor is None:
+        return None
+    try:
+        return decode_cursor(cursor, datetime, UUID)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _check_ops_file_references(db: Session, status_id: int | None, countries_ids: list[int | None]):
+    """ Checked against the preloaded reference tables, without querying them """
+    if ops_statuses.missing(db, [status_id]):
+        raise HTTPException(status_code=404, detail="Ops status not found")
+    missing_countries_ids = countries.missing(db, countries_ids)
+    if missing_countries_ids:
+        raise HTTPException(status_code=404, detail=f"Countries not found. Invalid IDs: {', '.join(map(str, missing_countries_ids))}")
+
 
 """
     Operations files
 """
 
-@router.post("/", response_model=OpsFilePublic)
-def create_ops_file(ops_file: OpsFileCreate, db: SessionDep):
+def _create_ops_file(db: Session, ops_file: OpsFileCreate) -> OpsFilePublic:
+    _check_ops_file_references(db, ops_file.status_id, [ops_file.origin_country_id, ops_file.destination_country_id])
     db_ops_file = OpsFile.model_validate(ops_file)
     
-    # Add partners instances to Ops File instance
-    for partner_id in ops_file.partners_id:
-        db_partner = db.get(Partner, partner_id)
-        if not db_partner:
-            raise HTTPException(status_code=404, detail=f"Partner not found. Invalid ID: {partner_id}")
-        
-        db_ops_file.partners.append(db_partner)
+    # Check every partner at once
+    missing_partners_ids = find_missing_partners_ids(db, ops_file.partners_id)
+    if missing_partners_ids:
+        raise HTTPException(status_code=404, detail=f"Partners not found. Invalid IDs: {', '.join(map(str, missing_partners_ids))}")
 
     ops_file_id = db_ops_file.op_id
     creator_user_id = db_ops_file.creator_user_id
 
-    # Add packaging instances to ops file instance
-    for package_data in ops_file.packaging_data:
-        packaging_data = OpsFileCargoPackageCreateWithoutOpId.model_validate(package_data)
-        # Create package instance
-        db_package = OpsFileCargoPackage(op_id=ops_file_id, quantity=packaging_data.quantity, units=packaging_data.units)
-        # Associate it with ops file
-        db_ops_file.packaging.append(db_package)
-
     # Add comment if any (the creator is the author)
     if ops_file.comment is not None: 
         comment_data = OpsFileCommentBase.model_validate(ops_file.comment)
@@ -49,106 +71,323 @@ def create_ops_file(ops_file: OpsFileCreate, db: SessionDep):
         db_ops_file.comments.append(db_comment)
 
     db.add(db_ops_file)
+    # The ops file row must exist before its children rows
+    db.flush()
+
+    # Partners links and packages are written with multi-row inserts
+    insert_ops_file_partners(db, ops_file_id, ops_file.partners_id)
+    insert_ops_file_packaging(db, ops_file_id, ops_file.packaging_data)
+
     db.commit()
-    db.refresh(db_ops_file)
-    return db_ops_file
+    return get_ops_file_public(db, ops_file_id)
+
+@router.post("/", response_model=OpsFilePublic)
+async def create_ops_file(ops_file: OpsFileCreate, db: AsyncSessionDep):
+    # Dependent writes and checks, run by the sync implementation in a single greenlet
+    return await db.run_sync(_create_ops_file, ops_file)
 
 @router.get("/", response_model=list[OpsFilePublic]) 
-def read_ops_files(db: SessionDep):
-    ops_files = db.exec(select(OpsFile).order_by(desc(OpsFile.created_at))).all()
+async def read_ops_files(
+    db: AsyncReadSessionDep,
+    request: Request,
+    response: Response,
+    filters: Annotated[OpsFileFilters, Depends()],
+    limit: int = Query(default=50, ge=1, le=500),
+    cursor: Optional[str] = None,
+):
+    after = _decode_page_cursor(cursor)
+
+    # The page is first resolved with the versions only
+    versions = (await db.exec(ops_files_page_versions_statement(filters, limit, after))).all()
+
+    # The extra row only tells there is a next page
+    next_cursor = None
+    if len(versions) > limit:
+        versions = versions[:limit]
+        next_cursor = encode_cursor(versions[-1].created_at, versions[-1].op_id)
+
+    etag = make_etag(next_cursor, *[tuple(version) for version in versions])
+    if etag_matches(request, etag):
+        not_modified_response = not_modified(etag)
+        if next_cursor is not None:
+            not_modified_response.headers[NEXT_CURSOR_HEADER] = next_cursor
+        return not_modified_response
+
+    headers = {ETAG_HEADER: etag}
+    if next_cursor is not None:
+        headers[NEXT_CURSOR_HEADER] = next_cursor
+
+    ops_files = await db.run_sync(get_ops_files_public, [version.op_id for version in versions])
+
+    # The ops files are validated once by ops_files_public, they are dumped as they are
+    if FAST_JSON:
+        return json_response(models_json(_ops_files_adapter, ops_files), headers)
+
+    response.headers.update(headers)
     return ops_files
 
+@router.get("/summary", response_model=list[OpsFileSummary])
+async def read_ops_files_summary(
+    db: AsyncReadSessionDep,
+    response: Response,
+    filters: Annotated[OpsFileFilters, Depends()],
+    limit: int = Query(default=50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    expand: list[Literal["comments", "partners", "packaging"]] = Query(default=[]),
+):
+    after = _decode_page_cursor(cursor)
+
+    rows = (await db.exec(ops_files_summary_statement(filters, limit, after))).mappings().all()
+
+    # The extra row only tells there is a next page
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(rows[-1]["created_at"], rows[-1]["op_id"])
+
+    ops_files = [dict(row) for row in rows]
+
+    # Heavy relations are only loaded on demand
+    if expand and ops_files:
+        relations = await db.run_sync(load_ops_files_relations, [ops_file["op_id"] for ops_file in ops_files], set(expand))
+        for ops_file in ops_files:
+            for relation_name, relation_items in relations.items():
+                ops_file[relation_name] = relation_items.get(ops_file["op_id"], [])
+
+    return ops_files
+
+@router.get("/search", response_model=list[OpsFilePublic])
+async def read_ops_files_search(
+    db: AsyncReadSessionDep,
+    response: Response,
+    filters: Annotated[OpsFileFilters, Depends()],
+    q: str = Query(min_length=2, max_length=100),
+    limit: int = Query(default=50, ge=1, le=500),
+    cursor: Optional[str] = None,
+):
+    # Ranked results are paginated by offset (the cursor only wraps it)
+    offset = 0
+    if cursor is not None:
+        try:
+            offset, = decode_cursor(cursor, int)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        if offset < 0:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    ops_files = await db.run_sync(search_ops_files, q.strip(), filters, limit, offset)
+
+    # The extra row only tells there is a next page
+    if len(ops_files) > limit:
+        ops_files = ops_files[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(offset + limit)
+
+    return await db.run_sync(ops_files_public, ops_files)
+
+EXPORT_BATCH_SIZE = 1000
+
+def _stream_export_rows(statement):
+    """
+        Stream rows in partitions from a server-side cursor. The session is owned by the
+        generator because the response body is sent after the request dependencies are closed
+    """
+    with Session(read_engine) as session:
+        result = session.execute(statement.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        for partition in result.partitions():
+            yield partition
+
+@router.get("/export")
+def export_ops_files(
+    filters: Annotated[OpsFileFilters, Depends()],
+    format: Literal["csv", "ndjson"] = "csv",
+):
+    statement = ops_files_export_statement(filters)
+    columns = [column.name for column in statement.selected_columns]
+    partitions = _stream_export_rows(statement)
+    filename = f"ops_files_{datetime.utcnow():%Y%m%d%H%M%S}.{format}"
+
+    if format == "csv":
+        content, media_type = csv_chunks(columns, partitions), "text/csv"
+    else:
+        content, media_type = ndjson_chunks(columns, partitions), "application/x-ndjson"
+
+    return StreamingResponse(
+        content,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+@router.post("/import", response_model=OpsFileImportResult)
+async def import_ops_files(request: Request, db: SessionDep, format: Literal["csv", "jsonl"] = "csv"):
+    """
+        Bulk import of ops files. The request body is a CSV (header with OpsFileCreate fields, partners IDs
+        separated by ";", packaging_data as JSON) or JSON lines (one OpsFileCreate object per line).
+        Invalid rows are reported in the result, the valid ones are imported anyway.
+    """
+    body = await request.body()
+    try:
+        text = body.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="The file must be UTF-8 encoded")
+
+    rows = parse_csv_rows(text) if format == "csv" else parse_jsonl_rows(text)
+    # Validation and DB writes are blocking, keep them off the event loop
+    return await run_in_threadpool(import_ops_files_rows, db, rows)
+
+@router.get("/changes", response_model=OpsFileChanges)
+async def read_ops_files_changes(
+    db: AsyncSessionDep,
+    since: Optional[str] = None,
+    limit: int = Query(default=100, ge=1, le=1000),
+):
+    """
+        Incremental sync: ops files created, updated and deleted since the cursor returned by the previous call.
+        Without cursor every ops file is returned (paginated), and only the deletions after the first call.
+        Read from the primary: rows lagging on a replica could fall behind the returned cursor and be skipped
+    """
+    if since is None:
+        after_update, after_deletion = FEED_BEGINNING, (datetime.utcnow(), FEED_BEGINNING[1])
+    else:
+        try:
+            updated_at, op_id, deleted_at, deleted_op_id = decode_cursor(since, datetime, UUID, datetime, UUID)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        after_update, after_deletion = (updated_at, op_id), (deleted_at, deleted_op_id)
+
+    changed_ops_files, tombstones, has_more = await db.run_sync(ops_files_changes, after_update, after_deletion, limit)
+    changed_ops_files_public = await db.run_sync(ops_files_public, changed_ops_files)
+
+    # Files created after the previous position are new for the client
+    synced_until = after_update[0]
+    created = [ops_file for ops_file in changed_ops_files_public if ops_file.created_at > synced_until]
+    updated = [ops_file for ops_file in changed_ops_files_public if ops_file.created_at <= synced_until]
+
+    # Next positions are the last returned rows (or the current ones if nothing changed)
+    if changed_ops_files:
+        after_update = (changed_ops_files[-1].updated_at, changed_ops_files[-1].op_id)
+    if tombstones:
+        after_deletion = (tombstones[-1].deleted_at, tombstones[-1].op_id)
+
+    return {
+        "created": created,
+        "updated": updated,
+        "deleted": tombstones,
+        "next_cursor": encode_cursor(*after_update, *after_deletion),
+        "has_more": has_more,
+    }
+
 @router.get("/{ops_file_id}/", response_model=OpsFilePublic) 
-def read_ops_file(ops_file_id: UUID, db: SessionDep):
-    ops_file_db = db.get(OpsFile, ops_file_id)
-    if not ops_file_db:
+async def read_ops_file(ops_file_id: UUID, db: AsyncReadSessionDep, request: Request, response: Response):
+    # The versions are checked before loading and serializing the whole graph
+    version = (await db.exec(ops_file_version_statement(ops_file_id))).first()
+    if not version:
         raise HTTPException(status_code=404, detail="Ops file not found")   
 
-    return ops_file_db
+    etag = make_etag(tuple(version))
+    if etag_matches(request, etag):
+        return not_modified(etag)
 
-@router.patch("/{ops_file_id}/", response_model=OpsFilePublic)
-def update_ops_file(ops_file_id: UUID, ops_file: OpsFileUpdate, db: SessionDep):
+    ops_file = await db.run_sync(get_ops_file_public, ops_file_id)
+    if not ops_file:
+        raise HTTPException(status_code=404, detail="Ops file not found")   
+
+    response.headers[ETAG_HEADER] = etag
+    return ops_file
+
+def _update_ops_file(db: Session, ops_file_id: UUID, ops_file: OpsFileUpdate) -> OpsFilePublic:
     ops_file_db = db.get(OpsFile, ops_file_id)
     if not ops_file_db:
         raise HTTPException(status_code=404, detail="Ops file not found")
     ops_file_data = ops_file.model_dump(exclude_unset=True)
+    _check_ops_file_references(
+        db,
+        ops_file_data.get("status_id"),
+        [ops_file_data.get("origin_country_id"), ops_file_data.get("destination_country_id")],
+    )
     ops_file_db.sqlmodel_update(ops_file_data)
     
-    # Manage new partners list if provided
+    # Manage new partners list if provided (only the differences are written)
     if ops_file_data.get('partners_id') is not None:
-        # Reset current partners list
-        ops_file_db.partners.clear()
-        
-        # Iterate on new partners list and Add partners instances to Ops File instance
-        for partner_id in ops_file.partners_id:
-            db_partner = db.get(Partner, partner_id)
-             
-            if not db_partner:
-                raise HTTPException(status_code=404, detail=f"Partner not found for ID {partner_id}")
-        
-            ops_file_db.partners.append(db_partner)
-
-    # Manage new packaging list if provided
+        missing_partners_ids = sync_ops_file_partners(db, ops_file_id, ops_file.partners_id)
+        if missing_partners_ids:
+            raise HTTPException(status_code=404, detail=f"Partners not found. Invalid IDs: {', '.join(map(str, missing_partners_ids))}")
+
+    # Manage new packaging list if provided (only the differences are written)
     if ops_file_data.get('packaging_data') is not None:
-        # Reset current partners list
-        ops_file_db.packaging.clear()
-        
-        # Iterate on new partners list and Add partners instances to Ops File instance
-        for package_data in ops_file.packaging_data:
-            packaging_data = OpsFileCargoPackageCreateWithoutOpId.model_validate(package_data)
-            # Create package instance
-            db_package = OpsFileCargoPackage(
-                op_id=ops_file_id, 
-                quantity=packaging_data.quantity, 
-                units=packaging_data.units
-            )
-            # Associate it with ops file            
-            ops_file_db.packaging.append(db_package)
+        sync_ops_file_packaging(db, ops_file_id, ops_file.packaging_data)
 
+    # Always bumped, partners and packaging changes do not modify the ops file row
+    ops_file_db.updated_at = datetime.utcnow()
     db.add(ops_file_db)
     db.commit()
-    db.refresh(ops_file_db)
-    return ops_file_db
+    return get_ops_file_public(db, ops_file_id)
+
+@router.patch("/{ops_file_id}/", response_model=OpsFilePublic)
+async def update_ops_file(ops_file_id: UUID, ops_file: OpsFileUpdate, db: AsyncSessionDep):
+    # Dependent writes and checks, run by the sync implementation in a single greenlet
+    return await db.run_sync(_update_ops_file, ops_file_id, ops_file)
 
 @router.delete("/{ops_file_id}/")
-def delete_ops_file(ops_file_id: UUID, db: SessionDep):
-    ops_file = db.get(OpsFile, ops_file_id)
+async def delete_ops_file(ops_file_id: UUID, db: AsyncSessionDep):
+    ops_file = await db.get(OpsFile, ops_file_id)
     if not ops_file:
         raise HTTPException(status_code=404, detail="Ops File not found")
-    db.delete(ops_file)
-    db.commit()
+    await db.run_sync(delete_ops_file_with_tombstone, ops_file)
+    await db.commit()
     return {"ok": True}
 
 """
     Operations files comments
 """
 
+@router.get("/{ops_file_id}/comments/", response_model=list[OpsFileCommentPublic])
+async def read_ops_file_comments(
+    ops_file_id: UUID,
+    db: AsyncReadSessionDep,
+    response: Response,
+    limit: int = Query(default=50, ge=1, le=500),
+    cursor: Optional[str] = None,
+):
+    after = _decode_page_cursor(cursor)
+
+    if not (await db.exec(select(OpsFile.op_id).where(OpsFile.op_id == ops_file_id))).first():
+        raise HTTPException(status_code=404, detail="Ops file not found")
+
+    comments = (await db.exec(ops_file_comments_page_statement(ops_file_id, limit, after))).all()
+
+    # The extra row only tells there is a next page
+    if len(comments) > limit:
+        comments = comments[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(comments[-1].created_at, comments[-1].comment_id)
+
+    return comments
+
 @router.post("/comments", response_model=OpsFileCommentPublic) 
-def create_ops_file_comment(comment: OpsFileCommentCreate, db: SessionDep):
+async def create_ops_file_comment(comment: OpsFileCommentCreate, db: AsyncSessionDep):
     
     comment_db = OpsFileComment.model_validate(comment)
     
-    ops_file_db = db.get(OpsFile, comment_db.op_id)
+    ops_file_db = await db.get(OpsFile, comment_db.op_id)
 
     if not ops_file_db:
         raise HTTPException(status_code=404, detail="Ops file not found")   
 
     db.add(comment_db)
-    db.commit()
-    db.refresh(ops_file_db)
-    return comment_db
+    await db.run_sync(touch_ops_file, comment_db.op_id)
+    await db.commit()
+    # Reloaded with its author, relations cannot be lazy loaded by the serialization
+    return (await db.exec(ops_file_comment_statement(comment_db.comment_id).execution_options(populate_existing=True))).one()
 
 @router.get("/comments/{comment_id}/", response_model=OpsFileCommentPublic)
-def read_ops_file_comment(comment_id: UUID, db: SessionDep):
-    comment_db = db.get(OpsFileComment, comment_id)
+async def read_ops_file_comment(comment_id: UUID, db: AsyncReadSessionDep):
+    comment_db = (await db.exec(ops_file_comment_statement(comment_id))).first()
     if not comment_db:
         raise HTTPException(status_code=404, detail="Comment not found")   
     return comment_db
 
 @router.patch("/comments/{comment_id}/", response_model=OpsFileCommentPublic) 
-def update_ops_file_comment(comment_id: UUID, comment: OpsFileCommentUpdate, db: SessionDep):
+async def update_ops_file_comment(comment_id: UUID, comment: OpsFileCommentUpdate, db: AsyncSessionDep):
 
-    comment_db = db.get(OpsFileComment, comment_id)
+    comment_db = (await db.exec(ops_file_comment_statement(comment_id))).first()
 
     if not comment_db:
         raise HTTPException(status_code=404, detail="Comment not found")   
@@ -157,20 +396,21 @@ def update_ops_file_comment(comment_id: UUID, comment: OpsFileCommentUpdate, db:
     comment_db.sqlmodel_update(comment_data)
 
     db.add(comment_db)
-    db.commit()
-    db.refresh(comment_db)
-
-    return comment_db
+    await db.run_sync(touch_ops_file, comment_db.op_id)
+    await db.commit()
+    # The author may have changed
+    return (await db.exec(ops_file_comment_statement(comment_id).execution_options(populate_existing=True))).one()
 
 @router.delete("/comments/{comment_id}/") 
-def delete_ops_file_comment(comment_id: UUID, db: SessionDep):
-    comment_db = db.get(OpsFileComment, comment_id)
+async def delete_ops_file_comment(comment_id: UUID, db: AsyncSessionDep):
+    comment_db = await db.get(OpsFileComment, comment_id)
 
     if not comment_db:
         raise HTTPException(status_code=404, detail="Comment not found")   
     
-    db.delete(comment_db)
-    db.commit()
+    await db.delete(comment_db)
+    await db.run_sync(touch_ops_file, comment_db.op_id)
+    await db.commit()
     return {"ok": True}
 
 
@@ -179,15 +419,22 @@ def delete_ops_file_comment(comment_id: UUID, db: SessionDep):
 """
 
 @router.get("/status", response_model=list[OpsStatusPublic]) 
-def read_ops_statuses(db: SessionDep):
-    ops_statuses = db.exec(select(OpsStatus)).all()
-    return ops_statuses
+async def read_ops_statuses(db: AsyncReadSessionDep, request: Request, response: Response):
+    statuses = await db.run_sync(ops_statuses.snapshot)
+    if etag_matches(request, statuses.etag):
+        return not_modified(statuses.etag, statuses.headers)
+    response.headers.update(statuses.headers)
+    return list(statuses.rows.values())
 
 @router.get("/status/{status_id}/", response_model=OpsStatusPublic) 
-def read_ops_status(status_id: int, db: SessionDep):
-    ops_status = db.get(OpsStatus, status_id)
+async def read_ops_status(status_id: int, db: AsyncReadSessionDep, request: Request, response: Response):
+    statuses = await db.run_sync(ops_statuses.snapshot)
+    ops_status = statuses.rows.get(status_id)
     if not ops_status:
         raise HTTPException(status_code=404, detail="Ops status not found")
+    if etag_matches(request, statuses.etag):
+        return not_modified(statuses.etag, statuses.headers)
+    response.headers.update(statuses.headers)
     return ops_status
 
 """
@@ -198,19 +445,22 @@ def read_ops_status(status_id: int, db: SessionDep):
 
 
 @router.get("/general/statistics/") 
-def read_ops_statistics(db: SessionDep):
-    clients_count = db.exec(select(func.count(Client.client_id))).one() 
-    carriers_count = db.exec(select(func.count(Carrier.carrier_id))).one()
-    partners_count = db.exec(select(func.count(Partner.partner_id))).one()
-    ops_files_count = db.exec(select(func.count(OpsFile.op_id))).one()
-    closed_status_id = 0
-    closed_ops_files_count = db.exec(select(func.count(OpsFile.op_id)).where(OpsFile.status_id != closed_status_id)).one()
-    
-    return {
-        "total_clients": clients_count,
-        "total_partners": partners_count,
-        "total_carriers": carriers_count,
-        "total_ops_files": ops_files_count,
-        "total_closed_ops_files": closed_ops_files_count,
-        "total_open_ops_files": ops_files_count - closed_ops_files_count
-    }
\ No newline at end of file
+async def read_ops_statistics(db: AsyncSessionDep):
+    # Primary: the cache is dropped on commit, a lagging replica would refill it with the previous counts.
+    # At most one aggregate statement per OPS_STATISTICS_TTL reaches it.
+    return await db.run_sync(get_ops_statistics)
+
+"""
+    Analytics (served from the rollups refreshed in background)
+"""
+
+@router.get("/analytics/volume", response_model=list[OpsVolumeBucket])
+async def read_ops_volume(
+    db: AsyncReadSessionDep,
+    granularity: Literal["week", "month"] = "month",
+    group_by: list[Literal["op_type", "client", "carrier", "lane"]] = Query(default=[]),
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+):
+    rows = (await db.exec(ops_volume_statement(granularity, group_by, date_from, date_to))).mappings().all()
+    return rows
\ No newline at end of file
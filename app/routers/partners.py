@@ -1,15 +1,20 @@
-from fastapi import APIRouter,  HTTPException
-from sqlmodel import select, desc
+from datetime import datetime
+from fastapi import APIRouter, Depends,  HTTPException, Request, Response
+from sqlmodel import select, desc, func
+from sqlalchemy import update
 from sqlalchemy.orm import selectinload
-from app.database import SessionDep
-from app.models.partners import PartnerTypePublic, PartnerType, Partner, PartnerPublic, PartnerCreate, PartnerUpdate, PartnerContact, PartnerContactCreate, PartnerContactPublic, PartnerContactUpdate, PartnerContactCreateBase
+from app.database import SessionDep, ReadSessionDep
+from app.controllers.auth import require_token
+from app.lib.etag import make_etag, etag_matches, not_modified, ETAG_HEADER
+from app.controllers.reference_data import partner_types, countries
+from app.models.partners import PartnerTypePublic, Partner, PartnerPublic, PartnerCreate, PartnerUpdate, PartnerContact, PartnerContactCreate, PartnerContactPublic, PartnerContactUpdate, PartnerContactCreateBase
 from uuid import UUID
 from typing import List
 
 router = APIRouter(
     prefix="/partners",
     tags=["partners"],
-    dependencies=[],#[Depends(get_token_header)], # TODO add token auth
+    dependencies=[Depends(require_token)],
     responses={404: {"description": "Not found"}},
 )
 
@@ -18,23 +23,53 @@ router = APIRouter(
 """
 
 @router.get("/types/", response_model=list[PartnerTypePublic]) 
-def read_partner_types(db: SessionDep):
-    partner_types = db.exec(select(PartnerType)).all()
-    return partner_types
+def read_partner_types(db: ReadSessionDep, request: Request, response: Response):
+    types = partner_types.snapshot(db)
+    if etag_matches(request, types.etag):
+        return not_modified(types.etag, types.headers)
+    response.headers.update(types.headers)
+    return list(types.rows.values())
 
 @router.get("/types/{partner_type_id}/", response_model=PartnerTypePublic)
-def read_partner_type(partner_type_id: str, db: SessionDep):
-    partner_type = db.get(PartnerType, partner_type_id)
+def read_partner_type(partner_type_id: str, db: ReadSessionDep, request: Request, response: Response):
+    types = partner_types.snapshot(db)
+    partner_type = types.rows.get(partner_type_id)
     if not partner_type:
         raise HTTPException(status_code=404, detail="partner type not found")
+    if etag_matches(request, types.etag):
+        return not_modified(types.etag, types.headers)
+    response.headers.update(types.headers)
     return partner_type
 
 """ 
     Partner routes
 """
 
+def _touch_partners(db: SessionDep, partners_ids: set):
+    """ Bump the partners updated_at after a change of their contacts, embedded in the partners (and ops files) payloads """
+    partners_ids = {partner_id for partner_id in partners_ids if partner_id is not None}
+    if partners_ids:
+        db.execute(update(Partner).where(Partner.partner_id.in_(partners_ids)).values(updated_at=datetime.utcnow()))
+
+def _partners_version(db: SessionDep, partner_id: UUID | None = None) -> tuple:
+    """ Count and last update of the partners (or of a single one) and of their contacts, enough to fingerprint the responses """
+    partners = select(func.count(Partner.partner_id), func.max(Partner.updated_at))
+    contacts = select(func.count(PartnerContact.partner_contact_id), func.max(PartnerContact.updated_at))
+    if partner_id is not None:
+        partners = partners.where(Partner.partner_id == partner_id)
+        contacts = contacts.where(PartnerContact.partner_id == partner_id)
+    return (*db.exec(partners).one(), *db.exec(contacts).one())
+
+def _check_partner_references(db: SessionDep, partner_type_id: str | None, country_id: int | None):
+    """ Checked against the preloaded reference tables, without querying them """
+    if partner_types.missing(db, [partner_type_id]):
+        raise HTTPException(status_code=404, detail="partner type not found")
+    if countries.missing(db, [country_id]):
+        raise HTTPException(status_code=404, detail="Country not found")
+
 @router.post("/", response_model=PartnerPublic)
 def create_partner(partner: PartnerCreate, db: SessionDep):
+    _check_partner_references(db, partner.partner_type_id, partner.country_id)
     db_partner = Partner.model_validate(partner)
     # Obtained generated partner ID
     partner_id = db_partner.partner_id
@@ -56,22 +91,31 @@ def create_partner(partner: PartnerCreate, db: SessionDep):
     return db_partner
 
 @router.get("/", response_model=list[PartnerPublic]) 
-def read_partners(db: SessionDep):
+def read_partners(db: ReadSessionDep, request: Request, response: Response):
+    etag = make_etag(*_partners_version(db))
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    response.headers[ETAG_HEADER] = etag
     partners = db.exec(select(Partner).order_by(desc(Partner.created_at))).all()
     return partners
 
 @router.get("/{partner_id}/", response_model=PartnerPublic)
-def read_partner(partner_id: UUID, db: SessionDep):
-    partner = db.get(Partner, partner_id)
-    if not partner:
+def read_partner(partner_id: UUID, db: ReadSessionDep, request: Request, response: Response):
+    partners_count, *version = _partners_version(db, partner_id)
+    if not partners_count:
         raise HTTPException(status_code=404, detail="Partner not found")
-    return partner
+
+    etag = make_etag(*version)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    response.headers[ETAG_HEADER] = etag
+    return db.get(Partner, partner_id)
 
 
 @router.patch("/{partner_id}/", response_model=PartnerPublic)
 def update_partner(partner_id: UUID, partner: PartnerUpdate, db: SessionDep):
-    partner_db = db.get(Partner, partner_id)
-
     # Eagerly load carrier_contacts to ensure they are available for manipulation
     # This prevents N+1 queries and ensures the relationship is loaded before modifications.
     partner_db = db.exec(
@@ -82,6 +126,7 @@ def update_partner(partner_id: UUID, partner: PartnerUpdate, db: SessionDep):
     if not partner_db:
         raise HTTPException(status_code=404, detail="partner not found")
     partner_data = partner.model_dump(exclude_unset=True)
+    _check_partner_references(db, partner_data.get("partner_type_id"), partner_data.get("country_id"))
 
     partner_db.sqlmodel_update(partner_data)
 
@@ -89,8 +134,10 @@ def update_partner(partner_id: UUID, partner: PartnerUpdate, db: SessionDep):
 
     # Manage new contacts list if provided
     if provided_contacts is not None:
-        # Reset current contacts list
+        # Reset current contacts list (removed contacts become orphans and are deleted)
         partner_db.partner_contacts.clear()
+        # Delete them before inserting the new ones, contacts names are unique
+        db.flush()
         
         # Iterate on new contacts list and Add contacts instances to partner instance
         for contact_obtained_data in provided_contacts:
@@ -106,19 +153,10 @@ def update_partner(partner_id: UUID, partner: PartnerUpdate, db: SessionDep):
             )
             partner_db.partner_contacts.append(db_contact)
 
-    # Hackaround: the previous code leaves orphan contacts in DB. Therefore it is required to remove them
-
-    # Query for all orphan contacts
-    statement = select(PartnerContact).where(PartnerContact.partner_id == None)
-    orphan_contacts = db.exec(statement).all()
-
-    if not orphan_contacts:
-        orphan_contacts=[]
-
-    # Delete each orphan contact found
-    for contact in orphan_contacts:
-        db.delete(contact)
+        # Contacts changes alone do not touch the partner row, bump it so its ETag changes
+        partner_db.updated_at = datetime.utcnow()
 
+    # Replaced contacts are deleted on flush (delete-orphan cascade)
     db.add(partner_db)
     db.commit()
     db.refresh(partner_db)
@@ -143,24 +181,25 @@ def delete_partner(partner_id: UUID, db: SessionDep):
 def create_partner_contact(partner_contact: PartnerContactCreate, db: SessionDep):
     db_partner_contact = PartnerContact.model_validate(partner_contact)
     db.add(db_partner_contact)
+    _touch_partners(db, {db_partner_contact.partner_id})
     db.commit()
     db.refresh(db_partner_contact)
     return db_partner_contact
 
 @router.get("/contacts", response_model=List[PartnerContactPublic]) 
-def read_partners_contacts(db: SessionDep):
+def read_partners_contacts(db: ReadSessionDep):
     partner_contacts = db.exec(select(PartnerContact).order_by(desc(PartnerContact.created_at))).all()
     return partner_contacts
 
 @router.get("/contacts/{contact_id}/", response_model=PartnerContactPublic)
-def read_partner_contact(contact_id: UUID, db: SessionDep):
+def read_partner_contact(contact_id: UUID, db: ReadSessionDep):
     partner_contact = db.get(PartnerContact, contact_id)
     if not partner_contact:
         raise HTTPException(status_code=404, detail="Partner contact not found")
     return partner_contact
 
 @router.get("/contacts/partner/{partner_id}/", response_model=List[PartnerContactPublic])
-def read_partner_contacts_by_partner(partner_id: UUID, db: SessionDep):   
+def read_partner_contacts_by_partner(partner_id: UUID, db: ReadSessionDep):   
     partner = db.get(Partner, partner_id)
     if not partner:
         raise HTTPException(status_code=404, detail="Partner not found")
@@ -177,8 +216,11 @@ def update_partner_contact(contact_id: UUID, partner_contact: PartnerContactUpda
     if not partner_contact_db:
         raise HTTPException(status_code=404, detail="partner contact not found")
     partner_contact_data = partner_contact.model_dump(exclude_unset=True)
+    previous_partner_id = partner_contact_db.partner_id
     partner_contact_db.sqlmodel_update(partner_contact_data)
     db.add(partner_contact_db)
+    # Both partners when the contact is moved
+    _touch_partners(db, {previous_partner_id, partner_contact_db.partner_id})
     db.commit()
     db.refresh(partner_contact_db)
     return partner_contact_db
@@ -190,5 +232,6 @@ def delete_partner_contact(contact_id: UUID, db: SessionDep):
     if not partner_contact:
         raise HTTPException(status_code=404, detail="partner contact not found")
     db.delete(partner_contact)
+    _touch_partners(db, {partner_contact.partner_id})
     db.commit()
     return {"ok": True} 
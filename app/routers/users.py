@@ -1,27 +1,31 @@
-from fastapi import APIRouter,  HTTPException
+from fastapi import APIRouter, Depends,  HTTPException
 from sqlmodel import select, desc
-from app.database import SessionDep
+from app.database import SessionDep, ReadSessionDep
+from app.controllers.auth import require_token, revoked_users
 from app.models.users import User, UserPublic, UserCreate, UserUpdate
 from uuid import UUID
-from app.lib.crypto import hash_password, generate_salt
+from app.lib.crypto import hash_password_pooled
+from app.lib.emails import normalize_email
+from app.controllers.reference_data import user_roles
 
 router = APIRouter(
     prefix="/users",
     tags=["users"],
-    dependencies=[],#[Depends(get_token_header)], # TODO add token auth
+    dependencies=[Depends(require_token)],
     responses={404: {"description": "Not found"}},
 )
 
 @router.post("/", response_model=UserPublic)
 def create_user(user: UserCreate, db: SessionDep):
+    if user_roles.missing(db, [user.role_id]):
+        raise HTTPException(status_code=404, detail="User role not found")
 
-    salt = generate_salt()
-
-    hashed_password = hash_password(user.password, salt)
+    # Blocking wait for the bounded password workers pool (this handler runs in a threadpool thread)
+    hashed_password = hash_password_pooled(user.password)
     
     extra_data = {
         "hashed_password": hashed_password.strip(), 
-        "email": str(user.email).lower().strip(),
+        "email": normalize_email(user.email),
         "name": str(user.name).strip()
     }
     
@@ -32,12 +36,12 @@ def create_user(user: UserCreate, db: SessionDep):
     return db_user
 
 @router.get("/", response_model=list[UserPublic]) 
-def read_users(db: SessionDep):
+def read_users(db: ReadSessionDep):
     Users = db.exec(select(User).order_by(desc(User.created_at))).all()
     return Users
 
 @router.get("/{user_id}/", response_model=UserPublic)
-def read_user(user_id: UUID, db: SessionDep):
+def read_user(user_id: UUID, db: ReadSessionDep):
     user = db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -50,16 +54,24 @@ def update_user(user_id: UUID, user: UserUpdate, db: SessionDep):
     if not user_db:
         raise HTTPException(status_code=404, detail="User not found")
     user_data = user.model_dump(exclude_unset=True)
+    if user_roles.missing(db, [user_data.get("role_id")]):
+        raise HTTPException(status_code=404, detail="User role not found")
     
+    if user_data.get("email") is not None:
+        user_data["email"] = normalize_email(user_data["email"])
+
     if "password" in user_data:
-        salt = generate_salt()
-        hashed_password = hash_password(user_data["password"], salt)
-        user_data["hashed_password"] = hashed_password
+        user_data["hashed_password"] = hash_password_pooled(user_data["password"])
         del user_data["password"]
 
     user_db.sqlmodel_update(user_data)
     db.add(user_db)
     db.commit()
+    # Tokens issued before carry outdated credentials or role
+    if user_data.keys() & {"hashed_password", "role_id", "disabled"}:
+        revoked_users.revoke(user_id)
+    if user_db.disabled:
+        revoked_users.disable(user_id)
     db.refresh(user_db)
     return user_db
 
@@ -71,4 +83,5 @@ def delete_user(user_id: UUID, db: SessionDep):
         raise HTTPException(status_code=404, detail="User not found")
     db.delete(user)
     db.commit()
+    revoked_users.revoke(user_id, float("inf"))
     return {"ok": True} 
\ No newline at end of file
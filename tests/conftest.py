@@ -0,0 +1,90 @@
+"""
+    Tests run against a disposable Postgres database (the models use Postgres only indexes):
+
+        TEST_DATABASE_URL=postgresql+psycopg2://... python -m pytest
+
+    The read replica tests also need a second database (TEST_DATABASE_REPLICA_URL), standing for the replica.
+
+    Every test runs in a transaction rolled back at the end, the tests are skipped without TEST_DATABASE_URL.
+"""
+import os
+from uuid import uuid4
+import pytest
+from sqlalchemy import event, text
+from sqlmodel import SQLModel, Session, create_engine
+import app.models.analytics  # noqa: F401 (registers every table in the metadata)
+from app.models.carriers import CarrierType
+from app.models.clients import Client
+from app.models.geodata import Country
+from app.models.ops_files import OpsStatus
+from app.models.partners import PartnerType
+from app.models.users import UserRole
+
+TEST_DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+
+
+def _drop_trigram_indexes():
+    for table in SQLModel.metadata.sorted_tables:
+        for index in list(table.indexes):
+            if "gin_trgm_ops" in index.dialect_options["postgresql"]["ops"].values():
+                table.indexes.discard(index)
+
+
+def create_test_tables(engine):
+    """Schemas and tables of the models, in an empty (or already set up) test database."""
+    with engine.begin() as connection:
+        if connection.execute(text("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")).first():
+            connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        else:
+            # e.g. Postgres builds without the contrib modules: no test relies on the trigram indexes
+            _drop_trigram_indexes()
+        for schema in {table.schema for table in SQLModel.metadata.sorted_tables if table.schema}:
+            connection.execute(text(f'CREATE SCHEMA IF NOT EXISTS "{schema}"'))
+    SQLModel.metadata.create_all(engine)
+
+
+@pytest.fixture(scope="session")
+def engine():
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    engine = create_engine(TEST_DATABASE_URL)
+    create_test_tables(engine)
+    yield engine
+    engine.dispose()
+
+@pytest.fixture
+def db(engine):
+    with engine.connect() as connection:
+        transaction = connection.begin()
+        # Commits of the tested code release savepoints, the outer transaction is rolled back
+        with Session(bind=connection, join_transaction_mode="create_savepoint") as session:
+            yield session
+        transaction.rollback()
+
+@pytest.fixture
+def statements(engine):
+    """SQL statements sent to the database (clear it right before the measured code)."""
+    recorded = []
+
+    def record(connection, cursor, statement, parameters, context, executemany):
+        recorded.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    yield recorded
+    event.remove(engine, "before_cursor_execute", record)
+
+@pytest.fixture
+def references(db) -> dict:
+    """Rows every ops file refers to."""
+    suffix = uuid4().hex[:8]
+    rows = {
+        "status": OpsStatus(status_id=9000, status_name=f"status {suffix}"),
+        "client": Client(name=f"client {suffix}"),
+        "country": Country(country_id=9000, name=f"country {suffix}", iso2_code="ZZ", iso3_code="ZZZ"),
+        "carrier_type": CarrierType(carrier_type_id=f"ct-{suffix}", name=f"carrier type {suffix}"),
+        "partner_type": PartnerType(partner_type_id=f"pt-{suffix}", name=f"partner type {suffix}"),
+        "role": UserRole(role_id=f"role-{suffix}", role_name=f"role {suffix}"),
+    }
+    db.add_all(rows.values())
+    db.commit()
+    return rows
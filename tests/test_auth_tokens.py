@@ -0,0 +1,34 @@
+import time
+from uuid import uuid4
+from app.controllers.auth import RevokedUsers
+
+
+def test_deleted_users_stay_revoked_after_a_refresh():
+    revoked_users = RevokedUsers(max_size=10)
+    deleted_user_id = uuid4()
+    issued_at = time.time()
+
+    revoked_users.revoke(deleted_user_id, float("inf"))
+    revoked_users.replace_disabled(set())
+
+    assert revoked_users.is_revoked(deleted_user_id, issued_at)
+
+def test_users_enabled_again_are_accepted_after_a_refresh():
+    revoked_users = RevokedUsers(max_size=10)
+    user_id = uuid4()
+    issued_at = time.time()
+
+    revoked_users.disable(user_id)
+    assert revoked_users.is_revoked(user_id, issued_at)
+
+    revoked_users.replace_disabled(set())
+    assert not revoked_users.is_revoked(user_id, issued_at)
+
+def test_tokens_issued_after_a_revocation_are_accepted():
+    revoked_users = RevokedUsers(max_size=10)
+    user_id = uuid4()
+
+    revoked_users.revoke(user_id, revoked_at=100.0)
+
+    assert revoked_users.is_revoked(user_id, 99.0)
+    assert not revoked_users.is_revoked(user_id, 101.0)
@@ -0,0 +1,32 @@
+from uuid import uuid4
+from sqlalchemy import text
+from sqlmodel import select
+from app.lib.index_advisor import alter_foreign_key_ddl, find_mismatched_foreign_keys
+from app.models.carriers import Carrier, CarrierContact
+
+
+def test_foreign_keys_without_the_declared_cascade_are_recreated(db, references):
+    # As in the databases created before the contacts foreign key declared ON DELETE CASCADE
+    db.execute(text(
+        "ALTER TABLE carriers.carrier_contacts DROP CONSTRAINT carrier_contacts_carrier_id_fkey, "
+        "ADD CONSTRAINT carrier_contacts_carrier_id_fkey FOREIGN KEY (carrier_id) REFERENCES carriers.carriers (carrier_id)"
+    ))
+    mismatched = find_mismatched_foreign_keys(db.connection())
+    assert [(name, constraint.table.fullname) for name, constraint in mismatched] == [
+        ("carrier_contacts_carrier_id_fkey", "carriers.carrier_contacts"),
+    ]
+
+    for name, constraint in mismatched:
+        db.execute(text(alter_foreign_key_ddl(name, constraint)))
+    assert find_mismatched_foreign_keys(db.connection()) == []
+
+    # The passive_deletes relationship leaves the contacts to the database
+    suffix = uuid4().hex[:8]
+    carrier = Carrier(name=f"carrier {suffix}", carrier_type_id=references["carrier_type"].carrier_type_id)
+    carrier.carrier_contacts = [CarrierContact(name=f"carrier contact {suffix}")]
+    db.add(carrier)
+    db.commit()
+    db.delete(carrier)
+    db.commit()
+
+    assert db.exec(select(CarrierContact).where(CarrierContact.carrier_id == carrier.carrier_id)).all() == []
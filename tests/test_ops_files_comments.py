@@ -0,0 +1,35 @@
+from datetime import datetime, timedelta
+from app.controllers.ops_files import get_comments_overview
+from app.models.ops_files import OpsFile, OpsFileComment
+from tests.test_ops_files_loading import _create_ops_files
+
+
+def test_comments_overview_has_the_count_and_the_last_comment(db, references):
+    commented_id, uncommented_id = _create_ops_files(db, references, 2)
+    commented, uncommented = db.get(OpsFile, commented_id), db.get(OpsFile, uncommented_id)
+    author_user_id = commented.creator_user_id
+    created_at = datetime.utcnow()
+    db.add(OpsFileComment(op_id=commented_id, author_user_id=author_user_id, content="latest", created_at=created_at + timedelta(days=1)))
+    db.add(OpsFileComment(op_id=commented_id, author_user_id=author_user_id, content="older", created_at=created_at - timedelta(days=1)))
+    for comment in uncommented.comments:
+        db.delete(comment)
+    db.commit()
+
+    overview = get_comments_overview(db, [commented_id, uncommented_id])
+
+    assert list(overview) == [commented_id]
+    comment_count, last_comment = overview[commented_id]
+    assert comment_count == 4
+    assert last_comment.content == "latest"
+    assert last_comment.author.user_id == author_user_id
+
+def test_comments_overview_reads_the_last_comment_only(db, statements, references):
+    ops_files_ids = _create_ops_files(db, references, 2)
+
+    statements.clear()
+    get_comments_overview(db, ops_files_ids)
+    selects = [statement for statement in statements if statement.lstrip().upper().startswith("SELECT")]
+
+    # No window functions numbering every comment of the ops files
+    assert len(selects) == 1
+    assert "LATERAL" in selects[0] and " OVER " not in selects[0]
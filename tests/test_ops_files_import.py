@@ -0,0 +1,19 @@
+import logging
+import pytest
+from sqlalchemy.exc import DBAPIError
+from app.controllers.ops_files_import import _db_error_message
+from app.models.ops_files import OpsStatus
+
+
+def test_db_errors_are_reported_without_the_raw_message(db, references, caplog):
+    with pytest.raises(DBAPIError) as error:
+        with db.begin_nested():
+            db.add(OpsStatus(status_id=9001, status_name=references["status"].status_name))
+            db.flush()
+
+    with caplog.at_level(logging.WARNING, logger="app.controllers.ops_files_import"):
+        message = _db_error_message(3, error.value)
+
+    assert message == "Duplicated value of a unique field"
+    # The raw error (constraint and table names) is only logged
+    assert "row 3" in caplog.text and "duplicate key" in caplog.text
@@ -0,0 +1,55 @@
+from uuid import uuid4
+from app.controllers.ops_files import get_ops_files_public
+from app.models.carriers import Carrier, CarrierContact
+from app.models.ops_files import OpsFile, OpsFileCargoPackage, OpsFileComment
+from app.models.partners import Partner, PartnerContact
+from app.models.users import User
+
+
+def _create_ops_files(db, references: dict, count: int) -> list:
+    """Ops files with every relation embedded in OpsFilePublic populated."""
+    ops_files_ids = []
+    for _ in range(count):
+        suffix = uuid4().hex[:8]
+        user = User(name=f"user {suffix}", email=f"{suffix}@example.com", hashed_password="-", role_id=references["role"].role_id)
+        carrier = Carrier(name=f"carrier {suffix}", carrier_type_id=references["carrier_type"].carrier_type_id)
+        carrier.carrier_contacts = [CarrierContact(name=f"carrier contact {suffix}")]
+        partner = Partner(name=f"partner {suffix}", partner_type_id=references["partner_type"].partner_type_id, country_id=references["country"].country_id)
+        partner.partner_contacts = [PartnerContact(name=f"partner contact {suffix}")]
+        ops_file = OpsFile(
+            client_id=references["client"].client_id,
+            status_id=references["status"].status_id,
+            carrier=carrier,
+            partners=[partner],
+            creator=user,
+            assignee=user,
+            origin_country_id=references["country"].country_id,
+            destination_country_id=references["country"].country_id,
+        )
+        ops_file.packaging = [OpsFileCargoPackage(quantity=1, units="boxes"), OpsFileCargoPackage(quantity=2, units="pallets")]
+        ops_file.comments = [OpsFileComment(content="first", author=user), OpsFileComment(content="second", author=user)]
+        db.add(ops_file)
+        ops_files_ids.append(ops_file.op_id)
+    db.commit()
+    # Nothing is served from the identity map
+    db.expunge_all()
+    return ops_files_ids
+
+def _count_queries(db, statements, ops_files_ids: list) -> int:
+    db.expunge_all()
+    statements.clear()
+    ops_files = get_ops_files_public(db, ops_files_ids)
+    assert len(ops_files) == len(ops_files_ids)
+    # Only the loading queries (the session fixture also sends SAVEPOINT statements)
+    return len([statement for statement in statements if statement.lstrip().upper().startswith("SELECT")])
+
+
+def test_ops_files_list_query_budget_does_not_depend_on_rows(db, references, statements):
+    ops_files_ids = _create_ops_files(db, references, 10)
+
+    one_row_queries = _count_queries(db, statements, ops_files_ids[:1])
+    many_rows_queries = _count_queries(db, statements, ops_files_ids)
+
+    assert many_rows_queries == one_row_queries
+    # Main query, carrier, carrier contacts, partners, partner contacts, packaging and comments overview
+    assert one_row_queries <= 7
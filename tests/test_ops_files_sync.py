@@ -0,0 +1,51 @@
+from app.controllers.ops_files import sync_ops_file_packaging, sync_ops_file_partners
+from app.models.ops_files import OpsFile, OpsFileCargoPackage, OpsFileCargoPackageCreateWithoutOpId
+from app.models.partners import Partner
+
+
+def _writes(statements) -> list[str]:
+    return [statement for statement in statements if statement.lstrip().upper().startswith(("INSERT", "UPDATE", "DELETE"))]
+
+def _create_ops_file(db, references: dict, packages: list[tuple[float, str]], partners: list | None = None) -> OpsFile:
+    ops_file = OpsFile(client_id=references["client"].client_id, status_id=references["status"].status_id, partners=partners or [])
+    ops_file.packaging = [OpsFileCargoPackage(quantity=quantity, units=units) for quantity, units in packages]
+    db.add(ops_file)
+    db.commit()
+    return ops_file
+
+
+def test_editing_one_package_line_issues_a_single_update(db, references, statements):
+    packages = [(1, "boxes"), (2, "pallets"), (3, "crates")]
+    ops_file = _create_ops_file(db, references, packages)
+    ops_file_id = ops_file.op_id
+
+    requested = [OpsFileCargoPackageCreateWithoutOpId(quantity=quantity, units=units) for quantity, units in packages]
+    requested[1] = OpsFileCargoPackageCreateWithoutOpId(quantity=5, units="pallets")
+
+    statements.clear()
+    sync_ops_file_packaging(db, ops_file_id, requested)
+    db.commit()
+
+    writes = _writes(statements)
+    assert len(writes) == 1
+    assert writes[0].lstrip().upper().startswith("UPDATE")
+
+    db.expunge_all()
+    stored = db.get(OpsFile, ops_file_id).packaging
+    assert [(package.quantity, package.units) for package in stored] == [(1, "boxes"), (5, "pallets"), (3, "crates")]
+
+def test_unchanged_partners_and_packaging_issue_no_write(db, references, statements):
+    partners = [
+        Partner(name=f"partner {index} {references['client'].name}", partner_type_id=references["partner_type"].partner_type_id)
+        for index in range(3)
+    ]
+    packages = [(1, "boxes"), (2, "pallets")]
+    ops_file = _create_ops_file(db, references, packages, partners)
+    ops_file_id, partners_ids = ops_file.op_id, [partner.partner_id for partner in partners]
+
+    statements.clear()
+    assert sync_ops_file_partners(db, ops_file_id, partners_ids) == []
+    sync_ops_file_packaging(db, ops_file_id, [OpsFileCargoPackageCreateWithoutOpId(quantity=quantity, units=units) for quantity, units in packages])
+    db.commit()
+
+    assert _writes(statements) == []
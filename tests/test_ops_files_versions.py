@@ -0,0 +1,37 @@
+from sqlmodel import select
+from app.controllers.ops_files import ops_file_version_statement, ops_files_page_versions_statement
+from app.lib.etag import make_etag
+from app.models.ops_files import OpsFile, OpsFileFilters
+from app.models.users import User
+from tests.test_ops_files_loading import _create_ops_files
+
+
+def _detail_etag(db, ops_file_id) -> str:
+    # As GET /ops/{ops_file_id}/ builds it
+    version = db.exec(ops_file_version_statement(ops_file_id)).first()
+    return make_etag(tuple(version))
+
+def _list_etag(db) -> str:
+    # As GET /ops/ builds it (first page)
+    versions = db.exec(ops_files_page_versions_statement(OpsFileFilters(), 50)).all()
+    return make_etag(None, *[tuple(version) for version in versions])
+
+
+def test_ops_files_etags_are_stable(db, references):
+    ops_file_id, = _create_ops_files(db, references, 1)
+
+    assert _detail_etag(db, ops_file_id) == _detail_etag(db, ops_file_id)
+    assert _list_etag(db) == _list_etag(db)
+
+def test_ops_files_etags_change_with_the_embedded_users(db, references):
+    ops_file_id, = _create_ops_files(db, references, 1)
+    detail_etag, list_etag = _detail_etag(db, ops_file_id), _list_etag(db)
+
+    # The same user is the creator, the assignee and the comments author
+    user = db.exec(select(User).join(OpsFile, OpsFile.creator_user_id == User.user_id).where(OpsFile.op_id == ops_file_id)).one()
+    user.name = f"{user.name} (renamed)"
+    db.add(user)
+    db.commit()
+
+    assert _detail_etag(db, ops_file_id) != detail_etag
+    assert _list_etag(db) != list_etag
@@ -0,0 +1,100 @@
+"""
+    Read replica routing, through the app with two databases: TEST_DATABASE_URL as the primary and
+    TEST_DATABASE_REPLICA_URL as the replica (no replication, so each one tells where a read went).
+"""
+import os
+import time
+from uuid import uuid4
+import pytest
+from sqlalchemy import delete
+from sqlmodel import Session, create_engine
+from tests.conftest import TEST_DATABASE_URL, create_test_tables
+
+TEST_DATABASE_REPLICA_URL = os.environ.get("TEST_DATABASE_REPLICA_URL")
+if not TEST_DATABASE_URL or not TEST_DATABASE_REPLICA_URL:
+    pytest.skip("TEST_DATABASE_URL and TEST_DATABASE_REPLICA_URL are not set", allow_module_level=True)
+
+# Read by app.database on import
+os.environ["DATABASE_URL"] = TEST_DATABASE_URL
+os.environ["DATABASE_REPLICA_URL"] = TEST_DATABASE_REPLICA_URL
+os.environ["OPS_ROLLUPS_REFRESH_INTERVAL"] = "0"
+os.environ["REVOKED_USERS_REFRESH_INTERVAL"] = "0"
+
+from fastapi.testclient import TestClient
+from app.database import PRIMARY_STICKY_COOKIE, READ_PRIMARY_HEADER
+from app.main import app
+from app.models.clients import Client
+from app.models.users import User
+
+
+@pytest.fixture(scope="module")
+def replica_engine():
+    engine = create_engine(TEST_DATABASE_REPLICA_URL)
+    create_test_tables(engine)
+    yield engine
+    engine.dispose()
+
+@pytest.fixture(scope="module")
+def client(engine, replica_engine):
+    with TestClient(app) as client:
+        yield client
+
+@pytest.fixture
+def suffix(engine, replica_engine, client):
+    """Unique suffix of the rows written by a test, deleted from both databases afterwards."""
+    client.cookies.clear()
+    suffix = uuid4().hex[:8]
+    yield suffix
+    for database_engine in (engine, replica_engine):
+        with Session(database_engine) as session:
+            session.execute(delete(Client).where(Client.name.endswith(suffix)))
+            session.execute(delete(User).where(User.name.endswith(suffix)))
+            session.commit()
+
+def _add_to_replica(replica_engine, suffix: str):
+    with Session(replica_engine) as session:
+        session.add(Client(name=f"replica client {suffix}"))
+        session.add(User(name=f"replica user {suffix}", email=f"replica-{suffix}@example.com", hashed_password="-"))
+        session.commit()
+
+def _names(response) -> set[str]:
+    assert response.status_code == 200
+    return {row["name"] for row in response.json()}
+
+
+def test_reads_go_to_the_replica(client, replica_engine, suffix):
+    _add_to_replica(replica_engine, suffix)
+
+    # Async (clients) and sync (users) read sessions
+    assert f"replica client {suffix}" in _names(client.get("/clients/"))
+    assert f"replica user {suffix}" in _names(client.get("/users/"))
+
+def test_read_primary_header_forces_the_primary(client, replica_engine, suffix):
+    _add_to_replica(replica_engine, suffix)
+    headers = {READ_PRIMARY_HEADER: "true"}
+
+    assert f"replica client {suffix}" not in _names(client.get("/clients/", headers=headers))
+    assert f"replica user {suffix}" not in _names(client.get("/users/", headers=headers))
+
+def test_writes_set_the_sticky_cookie_and_reads_follow_the_primary(client, suffix):
+    response = client.post("/clients/", json={"name": f"primary client {suffix}"})
+    assert response.status_code == 200
+    assert float(response.cookies[PRIMARY_STICKY_COOKIE]) > time.time()
+
+    # The client sends the cookie back: its own write is visible although the replica does not have it
+    assert f"primary client {suffix}" in _names(client.get("/clients/"))
+
+    client.cookies.clear()
+    assert f"primary client {suffix}" not in _names(client.get("/clients/"))
+
+def test_expired_sticky_cookie_reads_from_the_replica(client, replica_engine, suffix):
+    _add_to_replica(replica_engine, suffix)
+    client.cookies.set(PRIMARY_STICKY_COOKIE, str(time.time() - 1))
+
+    assert f"replica client {suffix}" in _names(client.get("/clients/"))
+
+def test_failed_writes_do_not_set_the_sticky_cookie(client, suffix):
+    response = client.patch(f"/clients/{uuid4()}/", json={"name": f"missing client {suffix}"})
+
+    assert response.status_code == 404
+    assert PRIMARY_STICKY_COOKIE not in response.cookies
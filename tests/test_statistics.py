@@ -0,0 +1,28 @@
+from app.controllers.reference_data import ops_statuses
+from app.controllers.statistics import get_ops_statistics, statistics_cache
+from tests.test_ops_files_loading import _create_ops_files
+
+
+def test_ops_statistics_are_a_single_statement(db, statements, references):
+    status_id, status_name = references["status"].status_id, references["status"].status_name
+    _create_ops_files(db, references, 2)
+    statistics_cache.clear()
+    ops_statuses.invalidate()
+    ops_statuses.snapshot(db) # Loaded at startup
+
+    statements.clear()
+    statistics = get_ops_statistics(db)
+    selects = [statement for statement in statements if statement.lstrip().upper().startswith("SELECT")]
+
+    try:
+        assert len(selects) == 1
+        assert {"status_id": status_id, "status_name": status_name, "total": 2} in statistics["ops_files_by_status"]
+
+        # Served from the cache afterwards
+        statements.clear()
+        assert get_ops_statistics(db) == statistics
+        assert statements == []
+    finally:
+        # The rows are rolled back, so is what was read from them
+        statistics_cache.clear()
+        ops_statuses.invalidate()
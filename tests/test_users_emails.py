@@ -0,0 +1,28 @@
+from uuid import uuid4
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+from app.controllers.auth import user_by_email_statement
+from app.models.users import User
+
+
+def _query_plan(db, statement) -> str:
+    sql = statement.compile(dialect=db.get_bind().dialect, compile_kwargs={"literal_binds": True})
+    # The tests tables are tiny, a sequential scan would be cheaper than any index
+    db.execute(text("SET LOCAL enable_seqscan = off"))
+    return "\n".join(db.execute(text(f"EXPLAIN {sql}")).scalars())
+
+
+def test_login_lookup_uses_the_lower_email_index(db):
+    plan = _query_plan(db, user_by_email_statement("someone@example.com"))
+
+    assert "ux_users_email_lower" in plan
+
+def test_emails_are_unique_case_insensitively(db):
+    email = f"user-{uuid4().hex[:8]}@example.com"
+    db.add(User(name="user", email=email, hashed_password="-"))
+    db.commit()
+
+    db.add(User(name="user", email=email.upper(), hashed_password="-"))
+    with pytest.raises(IntegrityError):
+        db.commit()